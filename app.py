@@ -10,12 +10,13 @@ import chess.svg
 import cairosvg
 from stockfish import Stockfish
 import io
-from fen_predictor import load_model, load_image, predict_fen
+from fen_predictor import load_image, predict_fen
+from model_registry import get_model
+from square_changes import SquareChangeDetector
 import subprocess
 import sys
 import platform
 from tkinter import filedialog
-from PIL import ImageChops
 
 
 if getattr(sys, 'frozen', False):
@@ -155,7 +156,7 @@ class ChessHelperApp:
 
         self.region_box = None
         model_path = os.path.join(BASE_PATH, "ccn_model.pth")
-        self.model = load_model(model_path)
+        self.model = get_model(model_path)
         creationflags = subprocess.CREATE_NO_WINDOW if platform.system() == "Windows" else 0
         stockfish_path = os.path.join(BASE_PATH, "stockfish.exe")
         self.stockfish = Stockfish(
@@ -307,7 +308,7 @@ class ChessHelperApp:
         )
         if file_path:
             try:
-                self.model = load_model(file_path)
+                self.model = get_model(file_path)
                 self.set_status(f"✅ Model loaded: {os.path.basename(file_path)}", color="green")
                 print(f"Loaded model: {file_path}")
             except Exception as e:
@@ -358,14 +359,10 @@ class ChessHelperApp:
     
 
     def has_board_changed(self, new_img):
-        if not hasattr(self, "last_img"):
-            self.last_img = new_img
-            return True
-
-        diff = ImageChops.difference(self.last_img, new_img)
-        bbox = diff.getbbox()
-        self.last_img = new_img
-        return bbox is not None  # True if there's any difference
+        # Per-square signatures: a cursor, highlight or clock tick no longer counts as a change
+        if not hasattr(self, "square_detector"):
+            self.square_detector = SquareChangeDetector()
+        return bool(self.square_detector.update(new_img).any())
 
 
     def analysis_loop(self):
@@ -380,15 +377,10 @@ class ChessHelperApp:
                     time.sleep(0.5)
                     continue
 
-                resized_img.save("live_frame.png")
-                my_color = self.color_var.get()
-                image_tensor = load_image("live_frame.png", my_color=my_color)
-                raw_fen = predict_fen(self.model, image_tensor, my_color=my_color)
-
-                screenshot.save("live_frame.png")
+                # Preprocess the capture in memory; no PNG round-trip through live_frame.png
                 my_color = self.color_var.get()
-                image_tensor = load_image("live_frame.png", my_color=my_color)
-                raw_fen = predict_fen(self.model, image_tensor, my_color=my_color)
+                image_tensor = load_image(screenshot, my_color=my_color)
+                raw_fen = predict_fen(self.model, image_tensor, my_color=my_color, legal=True)
 
                 fen_parts = (raw_fen.strip().split(" ") + ["-"] * 6)[:6]
                 full_fen = " ".join(fen_parts)
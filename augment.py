@@ -0,0 +1,158 @@
+import math
+import torch
+import torch.nn.functional as F
+
+# Standard JPEG luminance quantization table (quality 50)
+_JPEG_TABLE = torch.tensor([
+    [16, 11, 10, 16, 24, 40, 51, 61],
+    [12, 12, 14, 19, 26, 58, 60, 55],
+    [14, 13, 16, 24, 40, 57, 69, 56],
+    [14, 17, 22, 29, 51, 87, 80, 62],
+    [18, 22, 37, 56, 68, 109, 103, 77],
+    [24, 35, 55, 64, 81, 104, 113, 92],
+    [49, 64, 78, 87, 103, 121, 120, 101],
+    [72, 92, 95, 98, 112, 100, 103, 99],
+], dtype=torch.float32)
+_GREY = torch.tensor([0.299, 0.587, 0.114]).view(1, 3, 1, 1)
+_BLUR = torch.tensor([[1.0, 2.0, 1.0], [2.0, 4.0, 2.0], [1.0, 2.0, 1.0]]) / 16
+HIGHLIGHT_COLOURS = torch.tensor([
+    [205, 210, 106], [170, 162, 58], [247, 236, 116], [155, 199, 0], [246, 246, 105], [235, 97, 80],
+], dtype=torch.float32)
+
+
+def _dct_matrix(n=8):
+    k = torch.arange(n, dtype=torch.float32)
+    d = torch.cos(math.pi * (2 * k[None, :] + 1) * k[:, None] / (2 * n)) * math.sqrt(2 / n)
+    d[0] /= math.sqrt(2)
+    return d
+
+
+_DCT = _dct_matrix()
+
+
+def _uniform(n, low, high, generator):
+    return low + (high - low) * torch.rand(n, generator=generator)
+
+
+def _chosen(n, prob, generator):
+    return torch.rand(n, generator=generator) < prob
+
+
+def highlight_squares(x, prob, generator=None):
+    # Tint up to two random squares per image the way sites mark the last move
+    b, _, h, w = x.shape
+    masks = torch.zeros(b, 64)
+    for _ in range(2):
+        squares = torch.randint(64, (b,), generator=generator)
+        masks[torch.arange(b), squares] = _chosen(b, prob, generator).float()
+    masks = F.interpolate(masks.view(b, 1, 8, 8), size=(h, w), mode="nearest")
+    colours = HIGHLIGHT_COLOURS[torch.randint(len(HIGHLIGHT_COLOURS), (b,), generator=generator)].view(b, 3, 1, 1)
+    alpha = _uniform(b, 0.35, 0.65, generator).view(b, 1, 1, 1) * masks
+    return x * (1 - alpha) + colours * alpha
+
+
+def flip_board(x, labels, prob, generator=None):
+    """The board seen from the other side: the 64 square tiles are moved to
+    the opposite corner but each stays upright, as on a site showing black
+    at the bottom, and the label grid is turned with them. (A1 and h8 are
+    both dark, so square colours still alternate correctly; a mirror
+    would swap them.) Needs tightly cropped boards, H and W multiples of 8."""
+    flip = _chosen(len(x), prob, generator)
+    if flip.any():
+        n, c, h, w = x[flip].shape
+        tiles = x[flip].reshape(n, c, 8, h // 8, 8, w // 8)
+        x[flip] = tiles.flip(dims=[2, 4]).reshape(n, c, h, w)
+        labels = labels.clone()
+        labels[flip] = labels[flip].flip(dims=[1, 2])
+    return x, labels
+
+
+def shift_scale(x, max_shift, max_scale, generator=None):
+    # Kept well under half a square so every piece stays on its square
+    b = len(x)
+    scale = 1 + _uniform(b, -max_scale, max_scale, generator)
+    theta = torch.zeros(b, 2, 3)
+    theta[:, 0, 0] = theta[:, 1, 1] = scale
+    theta[:, :, 2] = _uniform(2 * b, -max_shift, max_shift, generator).view(b, 2) * 2
+    grid = F.affine_grid(theta, list(x.shape), align_corners=False)
+    return F.grid_sample(x, grid, mode="bilinear", padding_mode="border", align_corners=False)
+
+
+def color_jitter(x, strength, generator=None):
+    b = len(x)
+    brightness = 1 + _uniform(b, -strength, strength, generator).view(b, 1, 1, 1)
+    contrast = 1 + _uniform(b, -strength, strength, generator).view(b, 1, 1, 1)
+    saturation = 1 + _uniform(b, -strength, strength, generator).view(b, 1, 1, 1)
+    x = x * brightness
+    mean = x.mean(dim=(1, 2, 3), keepdim=True)
+    x = (x - mean) * contrast + mean
+    grey = (x * _GREY).sum(dim=1, keepdim=True)
+    return (x - grey) * saturation + grey
+
+
+def blur(x, prob, generator=None):
+    chosen = _chosen(len(x), prob, generator)
+    if chosen.any():
+        kernel = _BLUR.expand(3, 1, 3, 3)
+        x[chosen] = F.conv2d(F.pad(x[chosen], (1, 1, 1, 1), mode="replicate"), kernel, groups=3)
+    return x
+
+
+def jpeg_quantize(x, prob, quality=(30, 90), generator=None):
+    """Blocky 8x8 DCT quantization as a JPEG encoder at a random quality would
+    do, without encoding; height and width must be multiples of 8."""
+    chosen = _chosen(len(x), prob, generator)
+    if not chosen.any():
+        return x
+    sub = x[chosen]
+    n, c, h, w = sub.shape
+    q = _uniform(n, quality[0], quality[1], generator)
+    # libjpeg's quality → table scaling
+    scale = torch.where(q < 50, 5000 / q, 200 - 2 * q) / 100
+    tables = (_JPEG_TABLE * scale.view(n, 1, 1)).clamp_min(1).view(n, 1, 1, 1, 8, 8)
+    blocks = (sub - 128).reshape(n, c, h // 8, 8, w // 8, 8).permute(0, 1, 2, 4, 3, 5)
+    coeffs = _DCT @ blocks @ _DCT.T
+    blocks = _DCT.T @ ((coeffs / tables).round() * tables) @ _DCT
+    x[chosen] = blocks.permute(0, 1, 2, 4, 3, 5).reshape(n, c, h, w) + 128
+    return x
+
+
+class BatchAugmenter:
+    """Augments whole uint8 batches ([B,3,H,W]) with their [B,8,8] labels.
+
+    Everything runs as batched tensor ops in float32, so the cost is paid
+    once per batch instead of per PIL image in each worker. Labels only
+    change with flip_board; the other steps keep every piece on its square.
+    flip is off by default because boards with a coordinate margin do not
+    split into 64 tiles.
+    """
+
+    def __init__(self, highlight=0.3, flip=0.0, shift=0.02, scale=0.03, jitter=0.2, blur=0.3,
+                 jpeg=0.4, seed=None):
+        self.highlight = highlight
+        self.flip = flip
+        self.shift = shift
+        self.scale = scale
+        self.jitter = jitter
+        self.blur = blur
+        self.jpeg = jpeg
+        self.generator = torch.Generator().manual_seed(seed) if seed is not None else None
+
+    def __call__(self, images, labels):
+        if images.dtype != torch.uint8:
+            images = (images * 255).round()
+        x = images.float()
+        g = self.generator
+        if self.highlight:
+            x = highlight_squares(x, self.highlight, g)
+        if self.flip and x.shape[2] % 8 == 0 and x.shape[3] % 8 == 0:
+            x, labels = flip_board(x, labels, self.flip, g)
+        if self.shift or self.scale:
+            x = shift_scale(x, self.shift, self.scale, g)
+        if self.jitter:
+            x = color_jitter(x, self.jitter, g)
+        if self.blur:
+            x = blur(x, self.blur, g)
+        if self.jpeg and x.shape[2] % 8 == 0 and x.shape[3] % 8 == 0:
+            x = jpeg_quantize(x, self.jpeg, generator=g)
+        return x.round_().clamp_(0, 255).to(torch.uint8), labels
@@ -0,0 +1,220 @@
+import argparse
+import datetime
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import numpy as np
+import torch
+from dataset import board_accuracy, load_labels
+from fen_codec import IDX_TO_PIECE
+from fen_predictor import load_image
+from inference import (
+    OnnxRuntimeBackend, TorchScriptBackend, artifact_path, export_onnx, export_torchscript, load_checkpoint,
+)
+from quantize_model import int8_path
+
+DEFAULT_CHECKPOINTS = ["ccn_model.pth"] + sorted(glob.glob(os.path.join("models", "*.pth")))
+BENCH_BACKENDS = ("eager", "fused", "torchscript", "onnx", "int8")
+DEFAULT_BATCH_SIZES = (1, 8, 32)
+DEFAULT_THREADS = sorted({1, os.cpu_count() or 1})
+DEFAULT_REPEATS = 20
+DEFAULT_WARMUP = 3
+NUM_CLASSES = len(IDX_TO_PIECE)
+
+
+def load_backend(checkpoint, backend, threads):
+    """Engine for one checkpoint/backend pair, or None when its artifact is missing.
+
+    Compiled artifacts are the siblings written by inference.py and
+    quantize_model.py.
+    """
+    if backend in ("eager", "fused"):
+        return load_checkpoint(checkpoint, fuse=backend == "fused")
+    path = int8_path(checkpoint) if backend == "int8" else artifact_path(checkpoint, backend)
+    if not os.path.exists(path):
+        return None
+    if backend == "onnx":
+        return OnnxRuntimeBackend(path, num_threads=threads)
+    return TorchScriptBackend(path)
+
+
+def export_missing(checkpoint):
+    model = None
+    for backend, export in (("torchscript", export_torchscript), ("onnx", export_onnx)):
+        path = artifact_path(checkpoint, backend)
+        if not os.path.exists(path):
+            model = model or load_checkpoint(checkpoint, fuse=True)
+            export(model, path)
+            print(f"📦 Exported {path}", file=sys.stderr)
+
+
+def latency(model, inputs, repeats=DEFAULT_REPEATS, warmup=DEFAULT_WARMUP):
+    """Seconds per call of model(inputs), one entry per timed repeat."""
+    times = []
+    with torch.no_grad():
+        for i in range(warmup + repeats):
+            start = time.perf_counter()
+            model(inputs)
+            if i >= warmup:
+                times.append(time.perf_counter() - start)
+    return np.array(times)
+
+
+def throughput_report(times, batch_size):
+    p50, p95, p99 = np.percentile(times, [50, 95, 99]) * 1000
+    return {
+        "images_per_sec": batch_size / times.mean(),
+        "latency_ms": {"mean": times.mean() * 1000, "p50": p50, "p95": p95, "p99": p99},
+    }
+
+
+def confusion_matrix(preds, targets):
+    """[13, 13] counts, rows = true class, columns = predicted class."""
+    index = targets.flatten().long() * NUM_CLASSES + preds.flatten().long()
+    return torch.bincount(index, minlength=NUM_CLASSES * NUM_CLASSES).reshape(NUM_CLASSES, NUM_CLASSES)
+
+
+def accuracy_report(model, images, labels, batch_size=32):
+    with torch.no_grad():
+        preds = torch.cat([model(batch).argmax(-1) for batch in images.split(batch_size)])
+    confusion = confusion_matrix(preds, labels)
+    per_piece = confusion.diag().float() / confusion.sum(dim=1).clamp_min(1)
+    per_square, exact_board = board_accuracy(preds, labels)
+    return {
+        "images": len(labels),
+        "per_square": per_square,
+        "exact_board": exact_board,
+        "per_piece_recall": {IDX_TO_PIECE[i]: per_piece[i].item() for i in range(NUM_CLASSES)},
+        "confusion": {"classes": [IDX_TO_PIECE[i] for i in range(NUM_CLASSES)], "matrix": confusion.tolist()},
+    }
+
+
+def load_benchmark_images(image_dir, count):
+    """([N,3,256,256] images, [N,8,8] labels or None). Labels come from
+    labels.txt when the folder has one; otherwise only speed is measured."""
+    if os.path.exists(os.path.join(image_dir, "labels.txt")):
+        samples, labels = load_labels(image_dir)
+        images = torch.cat([load_image(os.path.join(image_dir, name)) for name, _ in samples[:count]])
+        return images, torch.from_numpy(labels[:count].astype(np.int64))
+    paths = sorted(glob.glob(os.path.join(image_dir, "*.png")))[:count]
+    if not paths:
+        raise FileNotFoundError(f"No .png images found in {image_dir}")
+    return torch.cat([load_image(p) for p in paths]), None
+
+
+def batch_of(images, batch_size):
+    # Repeat the benchmark images to fill a batch without a bigger dataset
+    repeats = -(-batch_size // len(images))
+    return images.repeat(repeats, 1, 1, 1)[:batch_size].contiguous()
+
+
+def environment():
+    try:
+        import onnxruntime
+        ort_version = onnxruntime.__version__
+    except ImportError:
+        ort_version = None
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "onnxruntime": ort_version,
+    }
+
+
+def run(checkpoints, backends, batch_sizes, threads, images, labels, repeats=DEFAULT_REPEATS):
+    throughput, accuracy, skipped = [], [], []
+    for checkpoint in checkpoints:
+        for backend in backends:
+            for num_threads in threads:
+                torch.set_num_threads(num_threads)
+                model = load_backend(checkpoint, backend, num_threads)
+                if model is None:
+                    skipped.append({"checkpoint": checkpoint, "backend": backend, "reason": "no artifact"})
+                    break
+                for batch_size in batch_sizes:
+                    times = latency(model, batch_of(images, batch_size), repeats)
+                    result = {"checkpoint": checkpoint, "backend": backend, "threads": num_threads,
+                              "batch_size": batch_size, **throughput_report(times, batch_size)}
+                    throughput.append(result)
+                    print(f"{checkpoint} {backend:<11} threads={num_threads:<2} batch={batch_size:<3} "
+                          f"{result['images_per_sec']:8.1f} img/s  p50 {result['latency_ms']['p50']:7.2f} ms  "
+                          f"p99 {result['latency_ms']['p99']:7.2f} ms", file=sys.stderr)
+            else:
+                # Accuracy does not depend on threads: measure it once per backend
+                if labels is not None:
+                    report = accuracy_report(model, images, labels)
+                    accuracy.append({"checkpoint": checkpoint, "backend": backend, **report})
+                    print(f"{checkpoint} {backend:<11} per-square {report['per_square']:.2%}, "
+                          f"whole-board {report['exact_board']:.2%}", file=sys.stderr)
+    return {"throughput": throughput, "accuracy": accuracy, "skipped": skipped}
+
+
+def regressions(results, baseline, tolerance):
+    """Human-readable list of results worse than baseline by more than
+    tolerance (relative for speed, absolute for accuracy)."""
+    found = []
+    key = lambda r: (r["checkpoint"], r["backend"], r.get("threads"), r.get("batch_size"))
+    old_speed = {key(r): r["images_per_sec"] for r in baseline.get("throughput", [])}
+    for r in results["throughput"]:
+        old = old_speed.get(key(r))
+        if old and r["images_per_sec"] < old * (1 - tolerance):
+            found.append(f"{key(r)}: {old:.1f} → {r['images_per_sec']:.1f} img/s")
+    old_accuracy = {key(r): r for r in baseline.get("accuracy", [])}
+    for r in results["accuracy"]:
+        old = old_accuracy.get(key(r))
+        for metric in ("per_square", "exact_board"):
+            if old and r[metric] < old[metric] - tolerance:
+                found.append(f"{key(r)} {metric}: {old[metric]:.2%} → {r[metric]:.2%}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recognition accuracy and throughput per checkpoint and backend.")
+    parser.add_argument("checkpoints", nargs="*", default=DEFAULT_CHECKPOINTS)
+    parser.add_argument("--images", default=os.path.join("data", "train"),
+                        help="benchmark images; accuracy is reported when the folder has a labels.txt")
+    parser.add_argument("--count", type=int, default=256, help="max images to load")
+    parser.add_argument("--backends", nargs="+", choices=BENCH_BACKENDS, default=list(BENCH_BACKENDS))
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument("--threads", nargs="+", type=int, default=DEFAULT_THREADS)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--export", action="store_true", help="export missing TorchScript/ONNX artifacts first")
+    parser.add_argument("-o", "--out", default="benchmark.json")
+    parser.add_argument("--baseline", default=None, help="earlier benchmark JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="allowed drop: relative for img/s, absolute for accuracy")
+    args = parser.parse_args()
+
+    torch.manual_seed(0)
+    if args.export:
+        for checkpoint in args.checkpoints:
+            export_missing(checkpoint)
+    images, labels = load_benchmark_images(args.images, args.count)
+    results = run(args.checkpoints, args.backends, args.batch_sizes, args.threads, images, labels, args.repeats)
+    report = {
+        "environment": environment(),
+        "config": {"images": args.images, "count": len(images), "labelled": labels is not None,
+                   "batch_sizes": args.batch_sizes, "threads": args.threads, "repeats": args.repeats},
+        **results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Wrote {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f"❌ Regression {line}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
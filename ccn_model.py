@@ -1,3 +1,4 @@
+import copy
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
@@ -52,3 +53,116 @@ class CCN(nn.Module):
         x = x.permute(0, 2, 3, 1)  # → [B, 8, 8, 13]
 
         return x
+
+
+def board_to_squares(x):
+    # [B, C, 8*S, 8*S] -> [B*64, C, S, S], squares in row-major order (rank 8 first)
+    b, c, h, w = x.shape
+    s = h // 8
+    return x.reshape(b, c, 8, s, 8, s).permute(0, 2, 4, 1, 3, 5).reshape(b * 64, c, s, s)
+
+class SquareCCN(nn.Module):
+    """Classifies each 32x32 square crop on its own, with weights shared by all 64 squares.
+
+    forward() takes whole boards like CCN; classify_squares() takes crops, so
+    callers can re-run only the squares that changed.
+    """
+
+    def __init__(self, num_classes=13):
+        super().__init__()
+        self.features = nn.Sequential(
+            nn.Conv2d(3, 32, kernel_size=3, padding=1),
+            nn.BatchNorm2d(32),
+            nn.ReLU(inplace=True),
+            nn.MaxPool2d(2),  # → [N, 32, 16, 16]
+            nn.Conv2d(32, 64, kernel_size=3, padding=1),
+            nn.BatchNorm2d(64),
+            nn.ReLU(inplace=True),
+            nn.MaxPool2d(2),  # → [N, 64, 8, 8]
+            nn.Conv2d(64, 128, kernel_size=3, padding=1),
+            nn.BatchNorm2d(128),
+            nn.ReLU(inplace=True),
+            nn.AdaptiveAvgPool2d(1),  # → [N, 128, 1, 1]
+        )
+        self.dropout = nn.Dropout(0.3)
+        self.fc = nn.Conv2d(128, num_classes, kernel_size=1)
+
+    def classify_squares(self, crops):
+        x = self.features(crops)
+        x = self.dropout(x)
+        return self.fc(x).flatten(1)  # → [N, 13]
+
+    def forward(self, x):
+        logits = self.classify_squares(board_to_squares(x))
+        return logits.reshape(x.shape[0], 8, 8, -1)  # → [B, 8, 8, 13]
+
+
+def fuse_conv_bn(conv, bn):
+    # Fold an eval-mode BatchNorm into the conv before it:
+    # bn(conv(x)) == conv'(x) with w' = w * s, b' = (b - mean) * s + beta, s = gamma / sqrt(var + eps)
+    fused = nn.Conv2d(
+        conv.in_channels, conv.out_channels, conv.kernel_size,
+        stride=conv.stride, padding=conv.padding, dilation=conv.dilation,
+        groups=conv.groups, bias=True,
+    )
+    with torch.no_grad():
+        scale = bn.weight / torch.sqrt(bn.running_var + bn.eps)
+        bias = conv.bias if conv.bias is not None else torch.zeros_like(bn.running_mean)
+        fused.weight.copy_(conv.weight * scale.reshape(-1, 1, 1, 1))
+        fused.bias.copy_((bias - bn.running_mean) * scale + bn.bias)
+    return fused
+
+class FusedResidualBlock(nn.Module):
+    def __init__(self, block):
+        super().__init__()
+        self.conv1 = fuse_conv_bn(block.conv1, block.bn1)
+        self.conv2 = fuse_conv_bn(block.conv2, block.bn2)
+
+    def forward(self, x):
+        out = F.relu(self.conv1(x))
+        out = self.conv2(out)
+        return F.relu(out + x)
+
+class FusedCCN(nn.Module):
+    """Inference-only CCN: every BatchNorm folded into its conv, dropout removed."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.conv1 = fuse_conv_bn(model.conv1, model.bn1)
+        self.conv2 = fuse_conv_bn(model.conv2, model.bn2)
+        self.conv3 = fuse_conv_bn(model.conv3, model.bn3)
+        self.res1 = FusedResidualBlock(model.res1)
+        self.global_pool = model.global_pool
+        self.fc = model.fc
+        self.eval()
+
+    def forward(self, x):
+        x = F.max_pool2d(F.relu(self.conv1(x)), 2)
+        x = F.max_pool2d(F.relu(self.conv2(x)), 2)
+        x = F.max_pool2d(F.relu(self.conv3(x)), 2)
+        x = self.res1(x)
+        x = self.global_pool(x)
+        x = self.fc(x)
+        return x.permute(0, 2, 3, 1)
+
+def fuse_model(model):
+    """Return an inference-optimized copy of an eval-mode CCN.
+
+    Checkpoints from the older BatchNorm-free architecture (ccn_model_v1)
+    have nothing to fold, so only their dropout is removed.
+    SquareCCN keeps its class and classify_squares().
+    """
+    if isinstance(model, CCN):
+        return FusedCCN(model)
+    if isinstance(model, SquareCCN):
+        fused = copy.deepcopy(model).eval()
+        layers = list(fused.features)
+        for i, layer in enumerate(layers):
+            if isinstance(layer, nn.BatchNorm2d):
+                layers[i - 1], layers[i] = fuse_conv_bn(layers[i - 1], layer), nn.Identity()
+        fused.features = nn.Sequential(*[layer for layer in layers if not isinstance(layer, nn.Identity)])
+        fused.dropout = nn.Identity()
+        return fused
+    fused = copy.deepcopy(model).eval()
+    fused.dropout = nn.Identity()
+    return fused
@@ -0,0 +1,160 @@
+import heapq
+import numpy as np
+import torch
+from fen_codec import PIECE_TO_IDX
+
+WHITE_KING = PIECE_TO_IDX['K']
+BLACK_KING = PIECE_TO_IDX['k']
+WHITE_PAWN = PIECE_TO_IDX['P']
+BLACK_PAWN = PIECE_TO_IDX['p']
+
+# Starting counts of the pieces a pawn can promote to (N B R Q)
+PROMOTABLE_START = np.array([2, 2, 2, 1])
+
+BACK_RANK_SQUARES = list(range(8)) + list(range(56, 64))
+DEFAULT_MAX_EXPANSIONS = 200
+_NO_CHANGE = 1 << 30  # table entry for class changes the search never makes
+_KINGS = [WHITE_KING, BLACK_KING]
+_CHANGES = np.eye(13, dtype=np.int64)[None, :, :] - np.eye(13, dtype=np.int64)[:, None, :]  # [a, b] = +b -a
+
+
+def _violations(counts):
+    # counts: [..., 13] class counts. Classes 1-12 are P N B R Q K then p n b r q k,
+    # so both sides are checked at once as [..., 2, 6]
+    sides = counts[..., 1:].reshape(counts.shape[:-1] + (2, 6))
+    pawns = sides[..., 0]
+    # Every piece beyond the starting set must have been a pawn
+    promoted = np.maximum(sides[..., 1:5] - PROMOTABLE_START, 0).sum(axis=-1)
+    excess = (np.maximum(pawns - 8, 0) + np.maximum(sides.sum(axis=-1) - 16, 0)
+              + np.maximum(promoted - (8 - np.minimum(pawns, 8)), 0))
+    return excess.sum(axis=-1)
+
+
+def count_violation(board):
+    """How far a flat 64-square board is from satisfying the piece-count limits (0 = ok)."""
+    return int(_violations(np.bincount(board, minlength=13)))
+
+
+def _place_kings(log_probs):
+    # Exactly one king per side: with kings banned elsewhere each square takes its
+    # best other class, so the optimal pair of king squares is found exactly.
+    no_kings = log_probs.clone()
+    no_kings[:, [WHITE_KING, BLACK_KING]] = float("-inf")
+    rest, board = no_kings.max(dim=1)
+    gain_white = log_probs[:, WHITE_KING] - rest
+    gain_black = log_probs[:, BLACK_KING] - rest
+
+    pair = gain_white[:, None] + gain_black[None, :]
+    pair.fill_diagonal_(float("-inf"))
+    white_sq, black_sq = divmod(int(pair.argmax()), 64)
+    board[white_sq] = WHITE_KING
+    board[black_sq] = BLACK_KING
+    return board.tolist(), {white_sq, black_sq}
+
+
+def constrained_decode(logits, max_expansions=DEFAULT_MAX_EXPANSIONS):
+    """Most probable [8, 8] placement under basic chess constraints.
+
+    logits is [8, 8, 13] in white's orientation (row 0 = rank 8). The result
+    has exactly one king per side, no pawns on ranks 1 or 8, at most 8 pawns
+    and 16 pieces per side, and no more promoted pieces than missing pawns.
+    Kings and back-rank pawns are solved exactly; piece counts are repaired
+    with a uniform-cost search over single-square changes, bounded by a greedy
+    repair and by max_expansions; when the budget runs out the cheapest greedy
+    completion found is returned.
+    """
+    log_probs = torch.log_softmax(logits.detach().float().reshape(64, -1), dim=-1)
+    log_probs[BACK_RANK_SQUARES, WHITE_PAWN] = float("-inf")
+    log_probs[BACK_RANK_SQUARES, BLACK_PAWN] = float("-inf")
+
+    board, king_squares = _place_kings(log_probs)
+    violation = count_violation(board)
+    if violation == 0:
+        return torch.tensor(board).reshape(8, 8)
+
+    movable = np.ones(64, dtype=bool)
+    movable[list(king_squares)] = False
+    state = _search(tuple(board), violation, log_probs.numpy(), movable, max_expansions)
+    return torch.tensor(state).reshape(8, 8)
+
+
+def _change_table(counts):
+    # The violation depends only on the 13 class counts, so turning one a into one b
+    # has the same effect on every square: [13, 13] violations after each change
+    table = _violations(counts + _CHANGES)
+    table[counts == 0] = _NO_CHANGE
+    np.fill_diagonal(table, _NO_CHANGE)
+    table[_KINGS] = table[:, _KINGS] = _NO_CHANGE  # kings are placed exactly and never move
+    return table
+
+
+def _moves(state, violation, lp, movable):
+    """Single-square changes that strictly reduce the violation, as (cost, square,
+    class, new violation). Squares with the same class are interchangeable for the
+    counts, so only the cheapest square is offered for each class change."""
+    board = np.asarray(state)
+    table = _change_table(np.bincount(board, minlength=13))
+    helps = table < violation
+    movable = movable & (board != 0)
+    moves = []
+    for a in np.flatnonzero(helps.any(axis=1)):
+        squares = np.flatnonzero(movable & (board == a))
+        if not len(squares):
+            continue
+        targets = np.flatnonzero(helps[a])
+        cost = lp[squares, a][:, None] - lp[squares[:, None], targets]  # banned classes cost +inf
+        best = cost.argmin(axis=0)
+        for j, b in enumerate(targets):
+            move_cost = cost[best[j], j]
+            if move_cost < np.inf:
+                moves.append((float(move_cost), int(squares[best[j]]), int(b), int(table[a, b])))
+    return moves
+
+
+def _greedy(state, violation, lp, movable):
+    # Cheapest change per unit of violation removed until none is left; emptying
+    # an offending square always helps, so this ends. Returns (cost, state).
+    total = 0.0
+    while violation > 0:
+        move_cost, sq, c, child_violation = min(
+            _moves(state, violation, lp, movable),
+            key=lambda m: m[0] / (violation - m[3]),
+        )
+        state = state[:sq] + (c,) + state[sq + 1:]
+        violation = child_violation
+        total += move_cost
+    return total, state
+
+
+def _search(start, violation, lp, movable, max_expansions):
+    # Uniform-cost search finds the cheapest repair when only a few squares are off.
+    # A greedy repair bounds it: partial repairs already dearer are never expanded.
+    # If the expansion budget runs out, the least-violating partial repair is
+    # finished greedily too and the cheaper of the two complete repairs wins.
+    bound, best = _greedy(start, violation, lp, movable)
+    partial = (violation, 0.0, start)
+    heap = [(0.0, violation, start)]
+    seen = {start}
+    expansions = 0
+    while heap:
+        cost, violation, state = heapq.heappop(heap)
+        if cost >= bound:
+            return best
+        if violation == 0:
+            return state
+        if expansions == max_expansions:
+            break
+        partial = min(partial, (violation, cost, state))
+        expansions += 1
+        for move_cost, sq, c, child_violation in _moves(state, violation, lp, movable):
+            child = state[:sq] + (c,) + state[sq + 1:]
+            if child not in seen and cost + move_cost < bound:
+                seen.add(child)
+                heapq.heappush(heap, (cost + move_cost, child_violation, child))
+    violation, cost, state = partial
+    rest, finished = _greedy(state, violation, lp, movable)
+    return finished if cost + rest < bound else best
+
+
+def constrained_decode_batch(logits, max_expansions=DEFAULT_MAX_EXPANSIONS):
+    return torch.stack([constrained_decode(board, max_expansions) for board in logits])
@@ -0,0 +1,195 @@
+import argparse
+import csv
+import glob
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+import torch
+from fen_predictor import DEFAULT_BATCH_SIZE, iter_predict_details, load_model
+from image_pipeline import BatchDecoder
+from inference import BACKENDS
+from model_registry import get_model
+from preprocessing import preprocess_uint8, to_float_tensor
+from theme_router import DEFAULT_MAX_DISTANCE, THEMES_PATH, ThemeRouter, predict_routed_details
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp", ".webp")
+CSV_FIELDS = ["path", "fen", "confidence", "min_square_prob", "error"]
+
+
+def find_images(inputs):
+    """Expand directories (recursively) and glob patterns into a sorted, de-duplicated path list."""
+    paths = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            for root, _, files in os.walk(item):
+                paths.update(os.path.join(root, f) for f in files if f.lower().endswith(IMAGE_EXTENSIONS))
+        else:
+            paths.update(p for p in glob.glob(item, recursive=True) if p.lower().endswith(IMAGE_EXTENSIONS))
+    return sorted(os.path.normpath(p) for p in paths)
+
+
+def decode_image(path):
+    # Runs in a worker process: returns (path, uint8 [3,256,256] array or None, error)
+    try:
+        return path, np.ascontiguousarray(preprocess_uint8(path)), None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def decode_images(paths):
+    return [decode_image(p) for p in paths]
+
+
+def _truncate_partial_line(path):
+    # A crash mid-write can leave half a record; drop it so appends stay well-formed
+    with open(path, "rb+") as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end != len(data):
+            f.truncate(end)
+
+
+def load_done(path, fmt):
+    """Paths already written to an existing output file (the resume checkpoint)."""
+    if not os.path.exists(path):
+        return set()
+    _truncate_partial_line(path)
+    with open(path, newline="") as f:
+        if fmt == "csv":
+            return {row["path"] for row in csv.DictReader(f)}
+        return {json.loads(line)["path"] for line in f if line.strip()}
+
+
+class ResultWriter:
+    def __init__(self, path, fmt):
+        self.fmt = fmt
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "a", newline="")
+        if fmt == "csv":
+            self.writer = csv.DictWriter(self.file, fieldnames=CSV_FIELDS)
+            if new:
+                self.writer.writeheader()
+
+    def write(self, record):
+        if self.fmt == "csv":
+            self.writer.writerow(record)
+        else:
+            self.file.write(json.dumps(record) + "\n")
+
+    def checkpoint(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.checkpoint()
+        self.file.close()
+
+
+def process_batches(paths, batch_size=DEFAULT_BATCH_SIZE, workers=None):
+    """Same batches as image_pipeline.BatchDecoder, decoded in a process pool."""
+    workers = workers or os.cpu_count() or 1
+    chunks = iter([paths[i:i + batch_size] for i in range(0, len(paths), batch_size)])
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Only a bounded number of decoded batches are in flight at once
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(decode_images, chunk))
+            if len(pending) >= 2 * workers:
+                break
+
+        while pending:
+            decoded = pending.popleft().result()
+            next_chunk = next(chunks, None)
+            if next_chunk is not None:
+                pending.append(pool.submit(decode_images, next_chunk))
+
+            arrays = [a for _, a, _ in decoded if a is not None]
+            images = torch.from_numpy(np.stack(arrays)) if arrays else torch.empty((0, 3, 256, 256), dtype=torch.uint8)
+            errors = {path: error for path, a, error in decoded if a is None}
+            yield [path for path, _, _ in decoded], images, errors
+
+
+def convert(batches, total, model, writer, color="w", legal=False, router=None, loader=get_model):
+    """Write one record per image from (paths, uint8 images, errors) batches, checkpointing per batch.
+
+    With a ThemeRouter each image goes to the checkpoint for its theme
+    (loaded through loader) and model is not used.
+    """
+    done = 0
+    start = time.perf_counter()
+    for chunk, images, errors in batches:
+        predictions = iter([])
+        if len(images) and router is not None:
+            predictions = iter(predict_routed_details(router, to_float_tensor(images), color, len(images), top_k=1,
+                                                      legal=legal, loader=loader))
+        elif len(images):
+            predictions = iter_predict_details(model, to_float_tensor(images), color, len(images), top_k=1, legal=legal)
+
+        for path in chunk:
+            if path in errors:
+                writer.write({"path": path, "fen": None, "confidence": None, "min_square_prob": None, "error": errors[path]})
+                continue
+            prediction = next(predictions)
+            writer.write({
+                "path": path, "fen": prediction.fen, "confidence": prediction.confidence,
+                "min_square_prob": prediction.min_square_prob, "error": None,
+            })
+
+        writer.checkpoint()
+        done += len(chunk)
+        rate = done / (time.perf_counter() - start)
+        print(f"\r{done}/{total} images ({rate:.1f} img/s)", end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert board images to FENs without the GUI.")
+    parser.add_argument("inputs", nargs="+", help="image files, directories or glob patterns")
+    parser.add_argument("-o", "--out", required=True, help="output .jsonl or .csv (appended to / resumed from)")
+    parser.add_argument("--model", default="ccn_model.pth")
+    parser.add_argument("--backend", default="auto", choices=BACKENDS)
+    parser.add_argument("--color", default="w", choices=("w", "b", "auto"),
+                        help="side at the bottom of the images (auto: guess per image)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="decode processes/threads (default: CPU count)")
+    parser.add_argument("--decoder", choices=("process", "thread"), default="process",
+                        help="decode in a process pool or in threads sharing preallocated buffers")
+    parser.add_argument("--legal", action="store_true", help="decode to the most probable legal-looking board")
+    parser.add_argument("--format", choices=("jsonl", "csv"), default=None, help="default: from --out extension")
+    parser.add_argument("--route", nargs="?", const=THEMES_PATH, default=None, metavar="THEMES",
+                        help=f"pick the checkpoint per image by board theme (default file: {THEMES_PATH}); "
+                             "images matching no theme use --model")
+    parser.add_argument("--max-distance", type=float, default=DEFAULT_MAX_DISTANCE,
+                        help="theme feature distance past which --route falls back to --model")
+    args = parser.parse_args()
+
+    fmt = args.format or ("csv" if args.out.lower().endswith(".csv") else "jsonl")
+    paths = find_images(args.inputs)
+    done = load_done(args.out, fmt)
+    todo = [p for p in paths if p not in done]
+    print(f"Found {len(paths)} images, {len(done)} already converted, {len(todo)} to go", file=sys.stderr)
+    if not todo:
+        return
+
+    router = ThemeRouter.load(args.route, args.model, args.max_distance) if args.route else None
+    model = None if router else load_model(args.model, backend=args.backend)
+    writer = ResultWriter(args.out, fmt)
+    try:
+        if args.decoder == "thread":
+            batches = BatchDecoder(todo, args.batch_size, args.workers)
+        else:
+            batches = process_batches(todo, args.batch_size, args.workers)
+        convert(batches, len(todo), model, writer, args.color, args.legal, router,
+                partial(get_model, backend=args.backend))
+    finally:
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
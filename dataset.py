@@ -1,46 +1,180 @@
 import torch
 from torch.utils.data import Dataset
-from PIL import Image
 import numpy as np
+import argparse
+import hashlib
+import json
 import os
+from fen_codec import PIECE_TO_IDX, decode_placements, placement_error
+from preprocessing import preprocess, preprocess_uint8
 
-PIECE_TO_IDX = {
-    '.': 0, 'P': 1, 'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6,
-    'p': 7, 'n': 8, 'b': 9, 'r': 10, 'q': 11, 'k': 12
-}
+CACHE_IMAGES = "images.npy"
+CACHE_LABELS = "labels.npy"
+CACHE_INDEX = "index.json"
+LABELS_FILE = "labels.txt"
+LABELS_ARRAY = "labels.npz"  # pre-encoded [N, 8, 8] uint8 kept next to labels.txt, with its hash
+MAX_REPORTED_ERRORS = 20
+
+def board_accuracy(preds, targets):
+    """(per-square accuracy, whole-board accuracy) of [N, 8, 8] class predictions."""
+    per_square = (preds == targets).float().mean().item()
+    exact = (preds == targets).flatten(1).all(dim=1).float().mean().item()
+    return per_square, exact
 
 def fen_to_matrix(fen):
-    matrix = []
-    rows = fen.split()[0].split('/')
-    for row in rows:
-        expanded = []
-        for char in row:
-            if char.isdigit():
-                expanded.extend(['.'] * int(char))
-            else:
-                expanded.append(char)
-        matrix.append([PIECE_TO_IDX[c] for c in expanded])
-    return torch.tensor(matrix, dtype=torch.long)
+    return torch.from_numpy(decode_placements([fen])[0].astype(np.int64))
+
+def parse_labels(path):
+    """(line number, name, fen) for every non-blank line of a labels.txt."""
+    with open(path) as f:
+        lines = f.read().splitlines()
+    return [(n, *line.split(maxsplit=1)) for n, line in enumerate(lines, 1) if line.strip()]
+
+def read_samples(data_dir):
+    return [(entry[1], entry[2]) for entry in parse_labels(os.path.join(data_dir, LABELS_FILE)) if len(entry) == 3]
+
+def encode_labels(path):
+    """Validate a labels.txt and encode it in one pass.
+
+    Returns ([(name, fen)], [N, 8, 8] uint8 labels). Raises ValueError
+    listing every malformed line (missing FEN, wrong rank count, bad
+    characters) with its line number.
+    """
+    entries = parse_labels(path)
+    samples = [(entry[1], entry[2]) for entry in entries if len(entry) == 3]
+    if len(samples) == len(entries):
+        try:
+            return samples, decode_placements([fen for _, fen in samples])
+        except ValueError:
+            pass
+    # Only the failing path looks at lines one by one
+    errors = []
+    for entry in entries:
+        reason = placement_error(entry[2]) if len(entry) == 3 else "no FEN"
+        if reason:
+            errors.append(f"{path}:{entry[0]}: {reason}: {' '.join(entry[1:])!r}")
+    more = f"\n... and {len(errors) - MAX_REPORTED_ERRORS} more" if len(errors) > MAX_REPORTED_ERRORS else ""
+    raise ValueError(f"{len(errors)} malformed line(s) in {path}:\n" + "\n".join(errors[:MAX_REPORTED_ERRORS]) + more)
+
+def load_labels(data_dir):
+    """([(name, fen)], [N, 8, 8] uint8 labels) for a labelled image folder.
+
+    The encoded array is saved as labels.npz beside labels.txt together with
+    a SHA-1 of the text, and reused while the hash matches, so FENs are
+    validated and decoded once per edit rather than per epoch.
+    """
+    text_path = os.path.join(data_dir, LABELS_FILE)
+    array_path = os.path.join(data_dir, LABELS_ARRAY)
+    with open(text_path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    if os.path.exists(array_path):
+        with np.load(array_path) as cached:
+            if str(cached["source"]) == digest:
+                return read_samples(data_dir), cached["labels"]
+    samples, labels = encode_labels(text_path)
+    try:
+        with open(array_path + ".tmp", "wb") as f:
+            np.savez(f, labels=labels, source=digest)
+        os.replace(array_path + ".tmp", array_path)
+    except OSError:
+        pass  # read-only dataset: keep the labels in memory only
+    return samples, labels
 
 class ChessBoardDataset(Dataset):
     def __init__(self, data_dir):
         self.data_dir = data_dir
-        with open(os.path.join(data_dir, "labels.txt")) as f:
-            lines = f.read().splitlines()
-        self.samples = []
-        for line in lines:
-            parts = line.split(maxsplit=1)
-            if len(parts) == 2:
-                self.samples.append((parts[0], parts[1]))
+        self.samples, self.labels = load_labels(data_dir)
 
 
     def __len__(self):
         return len(self.samples)
 
     def __getitem__(self, idx):
-        img_name, fen = self.samples[idx]
-        img_path = os.path.join(self.data_dir, img_name)
-        img = Image.open(img_path).convert("RGB").resize((256, 256))
-        img_tensor = torch.from_numpy(np.array(img)).permute(2, 0, 1).float() / 255.0
-        label_matrix = fen_to_matrix(fen)
+        img_name, _ = self.samples[idx]
+        img_tensor = preprocess(os.path.join(self.data_dir, img_name))
+        label_matrix = torch.from_numpy(self.labels[idx]).long()
+        return img_tensor, label_matrix
+
+
+def compile_dataset(data_dir, cache_dir=None, size=256):
+    """Decode every labeled image in data_dir once into a memory-mapped cache.
+
+    The cache holds a [N, 3, size, size] uint8 image array, a [N, 8, 8] uint8
+    label array and an index.json with the source names and FENs.
+    """
+    cache_dir = cache_dir or os.path.join(data_dir, "cache")
+    samples, labels = load_labels(data_dir)  # fail before decoding any image
+
+    os.makedirs(cache_dir, exist_ok=True)
+    images = np.lib.format.open_memmap(
+        os.path.join(cache_dir, CACHE_IMAGES), mode="w+", dtype=np.uint8,
+        shape=(len(samples), 3, size, size),
+    )
+    for i, (img_name, _) in enumerate(samples):
+        images[i] = preprocess_uint8(os.path.join(data_dir, img_name), size)
+    images.flush()
+    del images
+
+    np.save(os.path.join(cache_dir, CACHE_LABELS), labels)
+    with open(os.path.join(cache_dir, CACHE_INDEX), "w") as f:
+        json.dump({
+            "size": size,
+            "names": [name for name, _ in samples],
+            "fens": [fen for _, fen in samples],
+        }, f)
+    return cache_dir
+
+class CachedChessBoardDataset(Dataset):
+    """ChessBoardDataset served from a compile_dataset cache.
+
+    Items are views into the memory-mapped arrays, so DataLoader workers share
+    the page cache instead of each decoding PNGs. With raw=True images are
+    returned as uint8 [3, H, W] without the float conversion.
+    """
+
+    def __init__(self, cache_dir, raw=False):
+        self.cache_dir = cache_dir
+        self.raw = raw
+        with open(os.path.join(cache_dir, CACHE_INDEX)) as f:
+            index = json.load(f)
+        self.names = index["names"]
+        self.fens = index["fens"]
+        self.images = None
+        self.labels = None
+
+    def _open(self):
+        # Copy-on-write maps are writable as far as torch is concerned but never touch the file
+        self.images = np.load(os.path.join(self.cache_dir, CACHE_IMAGES), mmap_mode="c")
+        self.labels = np.load(os.path.join(self.cache_dir, CACHE_LABELS), mmap_mode="c")
+
+    def __getstate__(self):
+        # Each worker maps the files itself rather than receiving a pickled copy
+        state = self.__dict__.copy()
+        state["images"] = state["labels"] = None
+        return state
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, idx):
+        if self.images is None:
+            self._open()
+        img_tensor = torch.from_numpy(self.images[idx])
+        if not self.raw:
+            img_tensor = img_tensor.float() / 255.0
+        label_matrix = torch.from_numpy(self.labels[idx]).long()
         return img_tensor, label_matrix
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile a labeled image folder into a memory-mapped cache.")
+    parser.add_argument("data_dir")
+    parser.add_argument("--out", default=None, help="cache directory (default: <data_dir>/cache)")
+    parser.add_argument("--size", type=int, default=256)
+    parser.add_argument("--labels-only", action="store_true", help=f"only validate labels.txt and write {LABELS_ARRAY}")
+    args = parser.parse_args()
+    if args.labels_only:
+        samples, _ = load_labels(args.data_dir)
+        print(f"✅ {len(samples)} valid labels in {os.path.join(args.data_dir, LABELS_ARRAY)}")
+    else:
+        print(f"Compiled cache: {compile_dataset(args.data_dir, args.out, args.size)}")
@@ -0,0 +1,91 @@
+import numpy as np
+
+PIECE_TO_IDX = {
+    '.': 0, 'P': 1, 'N': 2, 'B': 3, 'R': 4, 'Q': 5, 'K': 6,
+    'p': 7, 'n': 8, 'b': 9, 'r': 10, 'q': 11, 'k': 12
+}
+IDX_TO_PIECE = {v: k for k, v in PIECE_TO_IDX.items()}
+
+INVALID = 255
+
+# Lookup tables between class indices and ASCII bytes
+_IDX_TO_BYTE = np.frombuffer(
+    "".join(IDX_TO_PIECE[i] for i in range(len(IDX_TO_PIECE))).encode("ascii"), dtype=np.uint8
+)
+_BYTE_TO_IDX = np.full(256, INVALID, dtype=np.uint8)
+_BYTE_TO_IDX[_IDX_TO_BYTE] = np.arange(len(_IDX_TO_BYTE), dtype=np.uint8)
+
+_EXPAND_DIGITS = str.maketrans({str(n): "." * n for n in range(1, 9)})
+_PLACEMENT_CHARS = set(PIECE_TO_IDX) | set("12345678")
+
+
+def encode_placements(indices):
+    """Convert [B, 8, 8] (or a single [8, 8]) class indices to FEN placement strings."""
+    idx = np.asarray(indices, dtype=np.intp)
+    if idx.ndim == 2:
+        idx = idx[None]
+
+    empty = idx == 0
+    # run[..., c] = length of the run of empty squares ending at column c
+    run = np.zeros(idx.shape, dtype=np.uint8)
+    run[..., 0] = empty[..., 0]
+    for c in range(1, 8):
+        run[..., c] = (run[..., c - 1] + 1) * empty[..., c]
+    # An empty run is written out as its length on its last square only
+    run_end = empty.copy()
+    run_end[..., :-1] &= ~empty[..., 1:]
+
+    out = np.zeros(idx.shape[:2] + (9,), dtype=np.uint8)
+    out[..., :8] = np.where(empty, np.where(run_end, ord("0") + run, 0), _IDX_TO_BYTE[idx])
+    out[..., 8] = ord("/")
+    out[:, -1, 8] = ord("\n")
+
+    text = out.tobytes().translate(None, b"\0").decode("ascii")
+    return text.split("\n")[:-1]
+
+
+def placement_error(fen):
+    """Why fen's placement field is not a board decode_placements accepts, or None."""
+    if not fen.strip():
+        return "empty FEN"
+    ranks = fen.split(maxsplit=1)[0].split("/")
+    if len(ranks) != 8:
+        return f"{len(ranks)} ranks instead of 8"
+    for n, rank in enumerate(ranks):
+        bad = sorted(set(rank) - _PLACEMENT_CHARS)
+        if bad:
+            return f"bad character {bad[0]!r} in rank {8 - n}"
+        width = len(rank.translate(_EXPAND_DIGITS))
+        if width != 8:
+            return f"rank {8 - n} has {width} squares instead of 8"
+    return None
+
+
+def _malformed(fields, i):
+    return ValueError(f"Malformed FEN at index {i}: {fields[i]!r} ({placement_error(fields[i])})")
+
+
+def decode_placements(fens):
+    """Convert FEN strings (placement field or full FEN) to a [B, 8, 8] uint8 array.
+
+    Raises ValueError naming the first malformed entry.
+    """
+    fields = [fen.split(maxsplit=1)[0] if fen.strip() else "" for fen in fens]
+    expanded = [field.translate(_EXPAND_DIGITS) + "/" for field in fields]
+
+    bad = [len(e) != 72 for e in expanded]
+    if any(bad):
+        raise _malformed(fields, bad.index(True))
+
+    try:
+        buf = "".join(expanded).encode("ascii")
+    except UnicodeEncodeError:
+        i = next(i for i, e in enumerate(expanded) if not e.isascii())
+        raise _malformed(fields, i) from None
+
+    rows = np.frombuffer(buf, dtype=np.uint8).reshape(len(fields), 8, 9)
+    matrices = _BYTE_TO_IDX[rows[..., :8]]
+    bad = (matrices == INVALID).any(axis=(1, 2)) | (rows[..., 8] != ord("/")).any(axis=1)
+    if bad.any():
+        raise _malformed(fields, int(np.argmax(bad)))
+    return matrices
@@ -1,25 +1,37 @@
+import heapq
+import itertools
+from collections import namedtuple
 import torch
 import numpy as np
-from PIL import Image
-from dataset import PIECE_TO_IDX
-from ccn_model import CCN
+from fen_codec import IDX_TO_PIECE, encode_placements
+from inference import load_engine
+from preprocessing import preprocess
+from constrained_decoder import constrained_decode, constrained_decode_batch
+from orientation import detect_colors
 
 
 
-IDX_TO_PIECE = {v: k for k, v in PIECE_TO_IDX.items()}
+DEFAULT_BATCH_SIZE = 64
 
+# fen: argmax board; confidence: joint probability of that board under the
+# per-square softmax; min_square_prob: its least certain square;
+# square_probs: [8, 8, 13] in white's orientation; alternatives: the next
+# most probable boards as (fen, probability), best first.
+FenPrediction = namedtuple(
+    "FenPrediction", ["fen", "confidence", "min_square_prob", "square_probs", "alternatives"]
+)
 
-def load_model(path="ccn_model_final.pth", device=None):
-    model = CCN()  # <-- use new architecture
-    model.load_state_dict(torch.load(path, map_location=device or torch.device("cpu")))
-    model.eval()
-    return model
 
+def load_model(path="ccn_model_final.pth", device=None, backend="eager", fuse=False):
+    # .pth checkpoints load as an eager CCN unless another backend is requested;
+    # .ts / .onnx artifacts always load with their own backend (see inference.py).
+    # fuse=True returns the BatchNorm-folded FusedCCN (see fuse_model.py)
+    return load_engine(path, backend=backend, device=device, fuse=fuse)
 
-def load_image(path, my_color="w"):
-    img = Image.open(path).convert("RGB").resize((256, 256))
-    tensor = torch.from_numpy(np.array(img)).permute(2, 0, 1).float() / 255.0
-    return tensor.unsqueeze(0)
+
+def load_image(source, my_color="w"):
+    # source: file path, PIL image, NumPy array or encoded bytes (see preprocessing.py)
+    return preprocess(source).unsqueeze(0)
 
 
 def flip_fen_ranks(fen_str):
@@ -30,31 +42,159 @@ def flip_fen_ranks(fen_str):
     return " ".join(parts)
 
 
-def predict_fen(model, image_tensor, my_color="w"):
+def preds_to_fen(preds, my_color="w"):
+    # preds: [8, 8] class indices, already in white's orientation
+    return encode_placements(preds)[0] + f" {my_color} - - 0 1"
+
+
+def predict_fen(model, image_tensor, my_color="w", legal=False):
+    # legal=True decodes the most probable placement that passes basic chess
+    # constraints (see constrained_decoder.py) instead of the raw argmax;
+    # my_color="auto" guesses the side at the bottom (see orientation.py)
     with torch.no_grad():
         output = model(image_tensor)
-        preds = output.argmax(dim=-1).squeeze(0)
+        if my_color == "auto":
+            my_color = detect_colors(output)[0]
+        if legal:
+            preds = constrained_decode(output.squeeze(0))
+        else:
+            preds = output.argmax(dim=-1).squeeze(0)
 
         # Flip back the board if image was rotated
         if my_color == "b":
             preds = torch.flip(preds, dims=[0, 1])
 
-    fen_rows = []
-    for row in preds:
-        fen_row = ""
-        empty = 0
-        for idx in row:
-            piece = IDX_TO_PIECE[int(idx)]
-            if piece == ".":
-                empty += 1
-            else:
-                if empty > 0:
-                    fen_row += str(empty)
-                    empty = 0
-                fen_row += piece
-        if empty > 0:
-            fen_row += str(empty)
-        fen_rows.append(fen_row)
-
-    fen = "/".join(fen_rows) + f" {my_color} - - 0 1"
-    return fen
+    return preds_to_fen(preds, my_color)
+
+
+def _iter_batches(tensors, colors, batch_size):
+    # Groups single images ([3,H,W] or [1,3,H,W]) or a stacked [N,3,H,W]
+    # tensor into (batch, colors) chunks without materializing the input.
+    # A colour list of the wrong length raises ValueError instead of dropping images.
+    if torch.is_tensor(tensors) and tensors.dim() == 4:
+        tensors = iter(tensors)
+    if isinstance(colors, str):
+        pairs = zip(tensors, itertools.repeat(colors))
+    else:
+        pairs = zip(tensors, colors, strict=True)
+
+    images, batch_colors = [], []
+    for tensor, color in pairs:
+        if tensor.dim() == 4:
+            tensor = tensor.squeeze(0)
+        images.append(tensor)
+        batch_colors.append(color)
+        if len(images) == batch_size:
+            yield torch.stack(images), batch_colors
+            images, batch_colors = [], []
+    if images:
+        yield torch.stack(images), batch_colors
+
+
+def _iter_logits(model, tensors, colors, batch_size):
+    # Yields ([B,8,8,13] logits in white's orientation, colours) per batch;
+    # "auto" colours are replaced by the side detected at the bottom
+    for batch, batch_colors in _iter_batches(tensors, colors, batch_size):
+        with torch.no_grad():
+            logits = model(batch)
+
+        if "auto" in batch_colors:
+            detected = detect_colors(logits)
+            batch_colors = [d if c == "auto" else c for c, d in zip(batch_colors, detected)]
+
+        flip = torch.tensor([c == "b" for c in batch_colors])
+        if flip.any():
+            logits[flip] = torch.flip(logits[flip], dims=[1, 2])
+        yield logits, batch_colors
+
+
+def iter_predict_fens(model, tensors, colors="w", batch_size=DEFAULT_BATCH_SIZE, legal=False):
+    """Streaming form of predict_fens: yields one FEN per input image, in order,
+    running the model once per batch_size images."""
+    for logits, batch_colors in _iter_logits(model, tensors, colors, batch_size):
+        preds = constrained_decode_batch(logits) if legal else logits.argmax(dim=-1)
+        for placement, color in zip(encode_placements(preds), batch_colors):
+            yield placement + f" {color} - - 0 1"
+
+
+def predict_fens(model, tensors, colors="w", batch_size=DEFAULT_BATCH_SIZE, legal=False):
+    """Batched predict_fen. tensors is a [N,3,256,256] tensor or an iterable of
+    per-image tensors; colors is a single colour or one per image, and
+    "auto" detects it per image."""
+    return list(iter_predict_fens(model, tensors, colors, batch_size, legal))
+
+
+def _next_best_boards(deltas, squares, count):
+    # deltas: ascending log-prob costs of swapping one square to a lower-ranked
+    # class, squares: the square each cost belongs to. Enumerates subsets of
+    # swaps in increasing total cost (add-next / replace-last expansion) and
+    # keeps those touching each square at most once.
+    found = []
+    heap = [(deltas[0], (0,))] if deltas else []
+    while heap and len(found) < count:
+        cost, chosen = heapq.heappop(heap)
+        last = chosen[-1]
+        if last + 1 < len(deltas):
+            heapq.heappush(heap, (cost + deltas[last + 1], chosen + (last + 1,)))
+            heapq.heappush(heap, (cost - deltas[last] + deltas[last + 1], chosen[:-1] + (last + 1,)))
+        if len({squares[i] for i in chosen}) == len(chosen):
+            found.append((cost, chosen))
+    return found
+
+
+def _alternatives(log_probs, top_k):
+    # The k-1 runner-up boards only ever use the k-1 cheapest single-square
+    # swaps: any swap costlier than those is beaten by k-1 single swaps.
+    count = top_k - 1
+    values, classes = log_probs.reshape(64, -1).topk(top_k, dim=-1)
+    deltas = (values[:, :1] - values[:, 1:]).flatten()
+    deltas, order = deltas.topk(min(count, deltas.numel()), largest=False)
+    squares = (order // count).tolist()
+    ranks = (order % count + 1).tolist()
+
+    best = classes[:, 0]
+    base = values[:, 0].sum().item()
+    boards = []
+    for cost, chosen in _next_best_boards(deltas.tolist(), squares, count):
+        board = best.clone()
+        for i in chosen:
+            board[squares[i]] = classes[squares[i], ranks[i]]
+        boards.append((board.reshape(8, 8), np.exp(base - cost)))
+    return boards
+
+
+def iter_predict_details(model, tensors, colors="w", batch_size=DEFAULT_BATCH_SIZE, top_k=3, legal=False):
+    """Like iter_predict_fens but yields a FenPrediction per image, with
+    probabilities from the same forward pass and top_k boards in total.
+    With legal=True the fen and its confidence are for the constrained
+    board; alternatives are still taken from the unconstrained grid."""
+    for logits, batch_colors in _iter_logits(model, tensors, colors, batch_size):
+        log_probs = torch.log_softmax(logits.float(), dim=-1)
+        if legal:
+            preds = constrained_decode_batch(logits)
+            best = log_probs.gather(-1, preds.unsqueeze(-1)).squeeze(-1)
+        else:
+            best, preds = log_probs.max(dim=-1)
+        confidence = best.flatten(1).sum(dim=1).exp()
+        min_square = best.flatten(1).min(dim=1).values.exp()
+
+        for i, (placement, color) in enumerate(zip(encode_placements(preds), batch_colors)):
+            suffix = f" {color} - - 0 1"
+            alternatives = []
+            if top_k > 1:
+                boards = _alternatives(log_probs[i], top_k)
+                if boards:
+                    placements = encode_placements(torch.stack([b for b, _ in boards]))
+                    alternatives = [(p + suffix, float(prob)) for p, (_, prob) in zip(placements, boards)]
+            yield FenPrediction(
+                placement + suffix, confidence[i].item(), min_square[i].item(),
+                log_probs[i].exp(), alternatives,
+            )
+
+
+def predict_fens_details(model, tensors, colors="w", batch_size=DEFAULT_BATCH_SIZE, top_k=3, legal=False):
+    return list(iter_predict_details(model, tensors, colors, batch_size, top_k, legal))
+
+
+def predict_fen_details(model, image_tensor, my_color="w", top_k=3, legal=False):
+    return predict_fens_details(model, image_tensor, my_color, top_k=top_k, legal=legal)[0]
@@ -0,0 +1,63 @@
+import argparse
+import glob
+import os
+import sys
+import time
+import torch
+from ccn_model import fuse_model
+from fen_predictor import load_image
+from inference import load_checkpoint
+
+DEFAULT_CHECKPOINTS = ["ccn_model.pth"] + sorted(glob.glob(os.path.join("models", "*.pth")))
+
+
+def compare(model, fused, inputs):
+    with torch.no_grad():
+        expected = model(inputs)
+        actual = fused(inputs)
+    max_diff = (expected - actual).abs().max().item()
+    agreement = (expected.argmax(-1) == actual.argmax(-1)).float().mean().item()
+    return max_diff, agreement
+
+
+def time_forward(model, inputs, repeats=10):
+    with torch.no_grad():
+        model(inputs)
+        start = time.perf_counter()
+        for _ in range(repeats):
+            model(inputs)
+    return (time.perf_counter() - start) / repeats
+
+
+def verification_inputs(image_dir, count):
+    paths = sorted(glob.glob(os.path.join(image_dir, "*.png")))[:count]
+    images = [load_image(p) for p in paths]
+    # Pad with noise so the check still covers a full batch without a dataset
+    images.append(torch.rand(max(count - len(images), 1), 3, 256, 256))
+    return torch.cat(images)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fold BatchNorm into convs and verify the fused model matches the original.")
+    parser.add_argument("checkpoints", nargs="*", default=DEFAULT_CHECKPOINTS)
+    parser.add_argument("--images", default=os.path.join("data", "train"))
+    parser.add_argument("--count", type=int, default=16)
+    parser.add_argument("--atol", type=float, default=1e-4)
+    args = parser.parse_args()
+
+    inputs = verification_inputs(args.images, args.count)
+    failed = False
+    for path in args.checkpoints:
+        model = load_checkpoint(path)
+        fused = fuse_model(model)
+        max_diff, agreement = compare(model, fused, inputs)
+        ok = max_diff <= args.atol and agreement == 1.0
+        failed |= not ok
+        speedup = time_forward(model, inputs[:1]) / time_forward(fused, inputs[:1])
+        print(f"{'✅' if ok else '❌'} {path}: max |Δlogit| {max_diff:.2e}, "
+              f"argmax agreement {agreement:.2%}, single-board speedup {speedup:.2f}x")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
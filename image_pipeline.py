@@ -0,0 +1,106 @@
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import torch
+from fen_predictor import DEFAULT_BATCH_SIZE, iter_predict_details
+from preprocessing import INPUT_SIZE, resize_rgb, to_float_tensor
+
+DEFAULT_BUFFERS = 3
+
+
+def decode_into(source, out):
+    # out: uint8 [size, size, 3] view into a batch buffer
+    out[...] = resize_rgb(source, out.shape[0])
+
+
+class BatchDecoder:
+    """Decodes images on a thread pool into a ring of preallocated uint8 batch buffers.
+
+    Iterating yields (paths, images, errors) per batch: images is a uint8
+    [n, 3, H, W] view of the buffer for the n paths that decoded, errors maps
+    the other paths to their exception text. A buffer is reused once the
+    consumer asks for the next batch, so at most num_buffers batches are
+    decoded ahead and memory stays bounded. PIL releases the GIL while
+    decoding and resizing, so the threads overlap with model inference.
+    """
+
+    def __init__(self, paths, batch_size=DEFAULT_BATCH_SIZE, num_threads=None,
+                 num_buffers=DEFAULT_BUFFERS, size=INPUT_SIZE, pin_memory=None):
+        self.paths = list(paths)
+        self.batch_size = batch_size
+        self.num_threads = num_threads or os.cpu_count() or 1
+        pin_memory = torch.cuda.is_available() if pin_memory is None else pin_memory
+        self.buffers = [
+            torch.empty((batch_size, size, size, 3), dtype=torch.uint8, pin_memory=pin_memory)
+            for _ in range(num_buffers)
+        ]
+
+    def _produce(self, free, ready, stop):
+        try:
+            with ThreadPoolExecutor(self.num_threads) as pool:
+                for first in range(0, len(self.paths), self.batch_size):
+                    index = free.get()
+                    if stop.is_set():
+                        return
+                    chunk = self.paths[first:first + self.batch_size]
+                    buffer = self.buffers[index].numpy()
+                    futures = [pool.submit(decode_into, p, buffer[i]) for i, p in enumerate(chunk)]
+                    errors = {}
+                    for path, future in zip(chunk, futures):
+                        if future.exception() is not None:
+                            errors[path] = str(future.exception())
+                    ready.put((chunk, index, errors))
+            ready.put(None)
+        except BaseException as e:
+            ready.put(e)
+
+    def __iter__(self):
+        free = queue.Queue()
+        for index in range(len(self.buffers)):
+            free.put(index)
+        ready = queue.Queue()
+        stop = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(free, ready, stop), daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = ready.get()
+                if item is None:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                chunk, index, errors = item
+                good = [i for i, p in enumerate(chunk) if p not in errors]
+                images = self.buffers[index][:len(chunk)]
+                if len(good) != len(chunk):
+                    images = images[good]
+                yield chunk, images.permute(0, 3, 1, 2), errors
+                free.put(index)
+        finally:
+            stop.set()
+            free.put(0)  # wake the producer if it is waiting for a buffer
+
+
+def iter_pipelined_details(model, paths, colors="w", batch_size=DEFAULT_BATCH_SIZE,
+                           num_threads=None, top_k=1, legal=False):
+    """Yields (path, FenPrediction or None, error or None) for each path, in order,
+    decoding upcoming batches on background threads while the model runs.
+    colors is a single colour or one per path."""
+    paths = list(paths)
+    if not isinstance(colors, str) and len(colors) != len(paths):
+        raise ValueError(f"Got {len(colors)} colors for {len(paths)} paths")
+    start = 0
+    for chunk, images, errors in BatchDecoder(paths, batch_size, num_threads):
+        predictions = iter([])
+        if len(images):
+            # Colours of the images that decoded, in the order they sit in the batch
+            chunk_colors = colors if isinstance(colors, str) else [
+                color for path, color in zip(chunk, colors[start:start + len(chunk)]) if path not in errors]
+            predictions = iter_predict_details(model, to_float_tensor(images), chunk_colors, batch_size, top_k, legal)
+        start += len(chunk)
+        for path in chunk:
+            if path in errors:
+                yield path, None, errors[path]
+            else:
+                yield path, next(predictions), None
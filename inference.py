@@ -0,0 +1,164 @@
+import argparse
+import os
+import torch
+from ccn_model import CCN, SquareCCN, fuse_model
+from ccn_model_v1 import CCN as CCNv1
+
+TORCHSCRIPT_EXT = ".ts"
+ONNX_EXT = ".onnx"
+BACKENDS = ("auto", "eager", "torchscript", "onnx")
+
+INPUT_SHAPE = (1, 3, 256, 256)
+
+
+def build_model(state_dict):
+    if "features.0.weight" in state_dict:
+        return SquareCCN()
+    # models/ccn_model_lichess.pth predates the BatchNorm + residual architecture
+    return CCN() if "bn1.weight" in state_dict else CCNv1()
+
+
+def load_checkpoint(path, device=None, fuse=False):
+    state_dict = torch.load(path, map_location=device or torch.device("cpu"))
+    model = build_model(state_dict)
+    model.load_state_dict(state_dict)
+    model.eval()
+    return fuse_model(model) if fuse else model
+
+
+def artifact_path(checkpoint_path, backend):
+    ext = {"torchscript": TORCHSCRIPT_EXT, "onnx": ONNX_EXT}[backend]
+    return os.path.splitext(checkpoint_path)[0] + ext
+
+
+def _is_stale(compiled, checkpoint_path):
+    # An artifact exported before the checkpoint was last written holds old weights
+    return os.path.getmtime(compiled) < os.path.getmtime(checkpoint_path)
+
+
+def _fresh_artifact(checkpoint_path, backend):
+    compiled = artifact_path(checkpoint_path, backend)
+    if not os.path.exists(compiled):
+        return None
+    if _is_stale(compiled, checkpoint_path):
+        print(f"⚠️ Ignoring {compiled}: older than {checkpoint_path}; re-export with: python inference.py {checkpoint_path}")
+        return None
+    return compiled
+
+
+def export_torchscript(model, path):
+    model.eval()
+    with torch.no_grad():
+        traced = torch.jit.trace(model, torch.zeros(INPUT_SHAPE))
+        traced = torch.jit.freeze(traced)
+    traced.save(path)
+    return path
+
+
+def export_onnx(model, path, opset_version=17):
+    model.eval()
+    torch.onnx.export(
+        model, (torch.zeros(INPUT_SHAPE),), path,
+        input_names=["image"], output_names=["logits"],
+        dynamic_axes={"image": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=opset_version,
+    )
+    return path
+
+
+class TorchScriptBackend:
+    name = "torchscript"
+
+    def __init__(self, path, device=None):
+        self.path = path
+        self.module = torch.jit.load(path, map_location=device or torch.device("cpu"))
+        self.module.eval()
+
+    def __call__(self, image_tensor):
+        with torch.no_grad():
+            return self.module(image_tensor)
+
+
+class OnnxRuntimeBackend:
+    name = "onnx"
+
+    def __init__(self, path, num_threads=None):
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise ImportError("The onnx backend requires onnxruntime (pip install onnxruntime)") from e
+
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, image_tensor):
+        image = image_tensor.detach().cpu().float().contiguous().numpy()
+        return torch.from_numpy(self.session.run(None, {self.input_name: image})[0])
+
+
+def _onnxruntime_available():
+    try:
+        import onnxruntime  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def load_engine(path, backend="eager", device=None, fuse=False):
+    """Load a model for inference.
+
+    Compiled artifacts (.ts, .onnx) are loaded with their own backend. For a
+    .pth checkpoint, backend picks eager PyTorch or the compiled sibling
+    artifact next to it; "auto" uses the fastest one present that is not
+    older than the checkpoint, and eager PyTorch otherwise. Every engine
+    is called like the CCN itself: [B,3,256,256] in, [B,8,8,13] logits out.
+    fuse=True folds BatchNorm into the convs of an eager model.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ONNX_EXT:
+        return OnnxRuntimeBackend(path)
+    if ext == TORCHSCRIPT_EXT:
+        return TorchScriptBackend(path, device)
+
+    if backend == "auto":
+        if _onnxruntime_available() and _fresh_artifact(path, "onnx"):
+            backend = "onnx"
+        elif _fresh_artifact(path, "torchscript"):
+            backend = "torchscript"
+        else:
+            backend = "eager"
+
+    if backend == "eager":
+        return load_checkpoint(path, device, fuse=fuse)
+
+    compiled = artifact_path(path, backend)
+    if not os.path.exists(compiled):
+        raise FileNotFoundError(f"No {backend} artifact at {compiled}; run: python inference.py {path} --format {backend}")
+    if _is_stale(compiled, path):
+        raise RuntimeError(f"{compiled} is older than {path}; re-export with: python inference.py {path} --format {backend}")
+    if backend == "onnx":
+        return OnnxRuntimeBackend(compiled)
+    return TorchScriptBackend(compiled, device)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export a CCN checkpoint to TorchScript and/or ONNX.")
+    parser.add_argument("checkpoint")
+    parser.add_argument("--format", nargs="+", choices=("torchscript", "onnx"), default=["torchscript", "onnx"])
+    args = parser.parse_args()
+
+    model = load_checkpoint(args.checkpoint, fuse=True)
+    for fmt in args.format:
+        out = artifact_path(args.checkpoint, fmt)
+        if fmt == "torchscript":
+            export_torchscript(model, out)
+        else:
+            export_onnx(model, out)
+        print(f"✅ Exported {fmt}: {out}")
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from fen_predictor import load_model
+
+DEFAULT_CAPACITY = 3
+
+
+def file_digest(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """Loads checkpoints on first use and keeps the most recently used ones resident.
+
+    Models are keyed by absolute path + content hash (plus any load_model
+    options), so an overwritten checkpoint is reloaded while two copies of
+    the same path never are. The hash is only recomputed when the file's
+    mtime or size changes.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, loader=load_model):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity = capacity
+        self.loader = loader
+        self._models = OrderedDict()
+        self._digests = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_time = 0.0
+
+    def _key(self, path, options):
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = self._digests.get(path)
+        if cached is None or cached[0] != signature:
+            cached = (signature, file_digest(path))
+            self._digests[path] = cached
+        return (path, cached[1]) + tuple(sorted(options.items()))
+
+    def get(self, path, **options):
+        """Return the model for path, loading it through load_model(path, **options) on a miss."""
+        with self._lock:
+            key = self._key(path, options)
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return model
+
+            self.misses += 1
+            start = time.perf_counter()
+            model = self.loader(path, **options)
+            self.load_time += time.perf_counter() - start
+
+            self._models[key] = model
+            while len(self._models) > self.capacity:
+                self._models.popitem(last=False)
+                self.evictions += 1
+            return model
+
+    def __contains__(self, path):
+        path = os.path.abspath(path)
+        with self._lock:
+            return any(key[0] == path for key in self._models)
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "load_time_s": self.load_time,
+                "resident": [key[0] for key in self._models],
+            }
+
+
+_default_registry = ModelRegistry()
+
+
+def get_model(path, **options):
+    return _default_registry.get(path, **options)
+
+
+def registry_stats():
+    return _default_registry.stats()
@@ -0,0 +1,31 @@
+import torch
+from fen_codec import PIECE_TO_IDX
+
+WHITE_PAWN = PIECE_TO_IDX['P']
+BLACK_PAWN = PIECE_TO_IDX['p']
+WHITE_KING = PIECE_TO_IDX['K']
+BLACK_KING = PIECE_TO_IDX['k']
+KING_WEIGHT = 0.5  # kings wander more than pawns, so they count for less
+
+# -1 for the top row of the image, +1 for the bottom row
+_ROW_DEPTH = (torch.arange(8, dtype=torch.float32) - 3.5) / 3.5
+
+
+def orientation_scores(logits):
+    """[B] evidence that white plays up the image (positive) or down it (negative).
+
+    logits: [B,8,8,13] as the model returns them, in image orientation.
+    Pawns only move forward and kings usually stay home, so white pawns and
+    king sit lower in the image than black's when white is at the bottom.
+    """
+    probs = torch.softmax(logits.float(), dim=-1)
+    depth = _ROW_DEPTH.to(probs.device).view(1, 8, 1)
+    pawns = (probs[..., WHITE_PAWN] - probs[..., BLACK_PAWN]) * depth
+    kings = (probs[..., WHITE_KING] - probs[..., BLACK_KING]) * depth
+    return (pawns + KING_WEIGHT * kings).flatten(1).sum(dim=1)
+
+
+def detect_colors(logits):
+    """Side at the bottom of each image ("w" or "b"), from orientation_scores.
+    Ties (no pawns or kings to go by) default to "w"."""
+    return ["b" if score < 0 else "w" for score in orientation_scores(logits).tolist()]
@@ -0,0 +1,63 @@
+import argparse
+import json
+import sys
+from collections import namedtuple
+import torch
+from board_locator import DEFAULT_MIN_BOARD, crop_box, locate_boards
+from convert_images import find_images
+from fen_predictor import load_model, predict_fens_details
+from inference import BACKENDS
+from preprocessing import preprocess, to_rgb_image
+
+# box: (x, y, w, h) on the page; confidence: the FEN's joint probability;
+# location_confidence: how clearly the board's grid was found.
+PageBoard = namedtuple("PageBoard", ["box", "fen", "confidence", "location_confidence"])
+
+
+def extract_boards(model, source, colors="auto", min_board=DEFAULT_MIN_BOARD, legal=False):
+    """Every board on a page as PageBoards, in reading order.
+
+    All crops go through the model in one batch. colors applies to every
+    board ("auto" guesses each one's orientation, see orientation.py).
+    """
+    page = to_rgb_image(source)
+    locations = locate_boards(page, min_board)
+    if not locations:
+        return []
+    batch = torch.stack([preprocess(crop_box(page, location.box)) for location in locations])
+    predictions = predict_fens_details(model, batch, colors, batch_size=len(locations), top_k=1, legal=legal)
+    return [
+        PageBoard(location.box, prediction.fen, prediction.confidence, location.confidence)
+        for location, prediction in zip(locations, predictions)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract every board on scanned pages or puzzle sheets as FENs.")
+    parser.add_argument("inputs", nargs="+", help="page images, directories or glob patterns")
+    parser.add_argument("-o", "--out", default=None, help="output .jsonl (default: stdout)")
+    parser.add_argument("--model", default="ccn_model.pth")
+    parser.add_argument("--backend", default="auto", choices=BACKENDS)
+    parser.add_argument("--color", default="auto", choices=("w", "b", "auto"), help="side at the bottom of the diagrams")
+    parser.add_argument("--min-board", type=int, default=DEFAULT_MIN_BOARD)
+    parser.add_argument("--legal", action="store_true", help="decode to the most probable legal-looking board")
+    args = parser.parse_args()
+
+    model = load_model(args.model, backend=args.backend)
+    out = open(args.out, "w") if args.out else sys.stdout
+    total = 0
+    try:
+        for path in find_images(args.inputs):
+            boards = extract_boards(model, path, args.color, args.min_board, args.legal)
+            for board in boards:
+                out.write(json.dumps({"page": path, **board._asdict()}) + "\n")
+            total += len(boards)
+            print(f"{path}: {len(boards)} boards", file=sys.stderr)
+    finally:
+        if args.out:
+            out.close()
+    print(f"✅ Extracted {total} boards", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
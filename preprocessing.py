@@ -0,0 +1,53 @@
+import io
+import os
+import numpy as np
+import torch
+from PIL import Image
+
+INPUT_SIZE = 256
+
+
+def to_rgb_image(source):
+    """Open source as an RGB PIL image.
+
+    source may be a PIL image, a NumPy array (H x W, H x W x 3 or H x W x 4,
+    uint8), encoded image bytes, or a file path.
+    """
+    if isinstance(source, Image.Image):
+        img = source
+    elif isinstance(source, np.ndarray):
+        img = Image.fromarray(source)
+    elif isinstance(source, (bytes, bytearray, memoryview)):
+        img = Image.open(io.BytesIO(source))
+    elif isinstance(source, (str, os.PathLike)):
+        img = Image.open(source)
+    else:
+        raise TypeError(f"Unsupported image source: {type(source).__name__}")
+    return img if img.mode == "RGB" else img.convert("RGB")
+
+
+def resize_rgb(source, size=INPUT_SIZE):
+    """The one preprocessing step shared by training and inference: uint8 [size, size, 3]."""
+    if (isinstance(source, np.ndarray) and source.dtype == np.uint8
+            and source.shape == (size, size, 3)):
+        return source
+    img = to_rgb_image(source)
+    if img.size != (size, size):
+        img = img.resize((size, size))
+    return np.asarray(img)
+
+
+def preprocess_uint8(source, size=INPUT_SIZE):
+    """uint8 [3, size, size] array, the layout stored in dataset caches."""
+    return resize_rgb(source, size).transpose(2, 0, 1)
+
+
+def to_float_tensor(array):
+    """uint8 [..., 3, H, W] (array or tensor) -> float tensor in [0, 1]."""
+    tensor = torch.from_numpy(np.ascontiguousarray(array)) if isinstance(array, np.ndarray) else array
+    return tensor.float() / 255.0
+
+
+def preprocess(source, size=INPUT_SIZE):
+    """Model input for one image: float [3, size, size] in [0, 1]."""
+    return to_float_tensor(preprocess_uint8(source, size))
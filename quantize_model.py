@@ -0,0 +1,111 @@
+import argparse
+import glob
+import os
+import platform
+import random
+import torch
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+from dataset import LABELS_FILE, board_accuracy, load_labels
+from fen_predictor import load_image
+from inference import load_checkpoint
+
+INT8_SUFFIX = ".int8.ts"
+
+
+def default_engine():
+    return "qnnpack" if platform.machine().lower() in ("arm64", "aarch64") else "x86"
+
+
+def int8_path(checkpoint_path):
+    return os.path.splitext(checkpoint_path)[0] + INT8_SUFFIX
+
+
+def sample_images(image_dir, count, seed=0):
+    """Pick up to count images from image_dir; returns (paths, [N,3,256,256] tensor)."""
+    paths = sorted(glob.glob(os.path.join(image_dir, "*.png")))
+    random.Random(seed).shuffle(paths)
+    paths = paths[:count]
+    if not paths:
+        raise FileNotFoundError(f"No .png images found in {image_dir}")
+    return paths, torch.cat([load_image(p) for p in paths])
+
+
+def quantize_static(model, calibration, engine=None, batch_size=32):
+    """Post-training static int8 quantization of an eval-mode CCN.
+
+    Conv+BN+ReLU are fused, activation ranges are observed on the
+    calibration batch and the result is frozen to TorchScript so it loads
+    through fen_predictor.load_model like any other .ts artifact.
+    """
+    engine = engine or default_engine()
+    torch.backends.quantized.engine = engine
+    prepared = prepare_fx(model.eval(), get_default_qconfig_mapping(engine), (calibration[:1],))
+    with torch.no_grad():
+        for batch in calibration.split(batch_size):
+            prepared(batch)
+        quantized = convert_fx(prepared)
+        traced = torch.jit.trace(quantized, calibration[:1])
+    return torch.jit.freeze(traced)
+
+
+def evaluate(float_model, quant_model, images, labels=None, batch_size=32):
+    with torch.no_grad():
+        float_preds = torch.cat([float_model(b).argmax(-1) for b in images.split(batch_size)])
+        quant_preds = torch.cat([quant_model(b).argmax(-1) for b in images.split(batch_size)])
+
+    report = {"agreement": board_accuracy(quant_preds, float_preds)}
+    if labels is not None:
+        report["float"] = board_accuracy(float_preds, labels)
+        report["int8"] = board_accuracy(quant_preds, labels)
+    return report
+
+
+def labels_for(paths, image_dir):
+    # Ground truth is optional: only used when the folder ships a labels.txt
+    if not os.path.exists(os.path.join(image_dir, LABELS_FILE)):
+        return None
+    samples, labels = load_labels(image_dir)
+    rows = {name: i for i, (name, _) in enumerate(samples)}
+    names = [os.path.basename(p) for p in paths]
+    if not all(name in rows for name in names):
+        return None
+    return torch.from_numpy(labels[[rows[n] for n in names]].astype("int64"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantize a CCN checkpoint to a static int8 TorchScript model.")
+    parser.add_argument("checkpoint")
+    parser.add_argument("--images", default=os.path.join("data", "train"), help="calibration / evaluation images")
+    parser.add_argument("--samples", type=int, default=256, help="number of calibration images")
+    parser.add_argument("--eval-samples", type=int, default=128,
+                        help="images held out from calibration to measure accuracy (at most half the folder)")
+    parser.add_argument("--engine", choices=("x86", "fbgemm", "qnnpack", "onednn"), default=default_engine())
+    parser.add_argument("--out", default=None, help=f"output path (default: <checkpoint>{INT8_SUFFIX})")
+    args = parser.parse_args()
+
+    model = load_checkpoint(args.checkpoint)
+    paths, images = sample_images(args.images, args.samples + args.eval_samples)
+    # Scoring on the calibration images would flatter int8: their ranges were observed exactly
+    split = len(paths) - min(args.eval_samples, len(paths) // 2)
+    quantized = quantize_static(model, images[:split], args.engine)
+
+    out = args.out or int8_path(args.checkpoint)
+    quantized.save(out)
+    print(f"✅ Saved int8 model: {out} "
+          f"({os.path.getsize(args.checkpoint) / 1e6:.2f} MB → {os.path.getsize(out) / 1e6:.2f} MB)")
+
+    if split == len(paths):
+        print("No images left to hold out for evaluation")
+        return
+    report = evaluate(model, quantized, images[split:], labels_for(paths[split:], args.images))
+    square, exact = report["agreement"]
+    print(f"int8 vs float on {len(paths) - split} held-out images: per-square {square:.2%}, whole-board {exact:.2%}")
+    for name in ("float", "int8"):
+        if name in report:
+            square, exact = report[name]
+            print(f"{name} vs labels: per-square {square:.2%}, whole-board {exact:.2%}")
+
+
+if __name__ == "__main__":
+    main()
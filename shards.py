@@ -0,0 +1,198 @@
+import argparse
+import io
+import json
+import os
+import random
+import tarfile
+import time
+import numpy as np
+import torch
+from torch.utils.data import IterableDataset, get_worker_info
+from dataset import load_labels
+from fen_codec import decode_placements
+from preprocessing import INPUT_SIZE, preprocess_uint8, to_float_tensor
+
+SHARD_INDEX = "shards.json"
+DEFAULT_SHARD_SIZE = 5000  # records per shard: a few hundred MB of PNGs, read front to back
+FEN_EXT = "fen"
+
+# A shard directory holds <prefix>-000000.tar, <prefix>-000001.tar, ... and an
+# shards.json listing every shard with its record count. Each record is two tar
+# members sharing a key, "<key>.png" (or .jpg) and "<key>.fen" holding the
+# placement as seen in the image, the same layout webdataset reads.
+
+
+def shard_name(prefix, number):
+    return f"{prefix}-{number:06d}.tar"
+
+
+def _add(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+class ShardWriter:
+    """Writes (key, image bytes, fen) records into fixed-size tar shards.
+
+    The index is written by close(), so a shard directory without one is
+    an interrupted run.
+    """
+
+    def __init__(self, out_dir, prefix="shard", shard_size=DEFAULT_SHARD_SIZE):
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.shards = []
+        self.tar = None
+        self.count = 0
+        os.makedirs(out_dir, exist_ok=True)
+
+    def _next_shard(self):
+        self._finish_shard()
+        name = shard_name(self.prefix, len(self.shards))
+        self.tar = tarfile.open(os.path.join(self.out_dir, name), "w")
+        self.shards.append({"name": name, "count": 0})
+
+    def _finish_shard(self):
+        if self.tar is not None:
+            self.tar.close()
+            self.tar = None
+
+    def write(self, key, image_bytes, fen, ext="png"):
+        if self.tar is None or self.shards[-1]["count"] >= self.shard_size:
+            self._next_shard()
+        _add(self.tar, f"{key}.{ext}", image_bytes)
+        _add(self.tar, f"{key}.{FEN_EXT}", fen.encode())
+        self.shards[-1]["count"] += 1
+        self.count += 1
+
+    def close(self):
+        self._finish_shard()
+        with open(os.path.join(self.out_dir, SHARD_INDEX), "w") as f:
+            json.dump({"total": self.count, "shards": self.shards}, f, indent=1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+        else:
+            self._finish_shard()
+
+
+def read_index(shard_dir):
+    with open(os.path.join(shard_dir, SHARD_INDEX)) as f:
+        return json.load(f)
+
+
+def iter_records(path):
+    """Yields (key, image bytes, fen) from one shard, reading it front to back."""
+    key, image, fen = None, None, None
+    with tarfile.open(path, "r|") as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            name, ext = os.path.basename(member.name).rsplit(".", 1)
+            if name != key:
+                if image is not None and fen is not None:
+                    yield key, image, fen
+                key, image, fen = name, None, None
+            data = tar.extractfile(member).read()
+            if ext == FEN_EXT:
+                fen = data.decode().strip()
+            else:
+                image = data
+    if image is not None and fen is not None:
+        yield key, image, fen
+
+
+def shuffled(items, buffer_size, rng):
+    # Streaming shuffle: keep buffer_size items and emit a random one as each new one arrives
+    buffer = []
+    for item in items:
+        if len(buffer) < buffer_size:
+            buffer.append(item)
+            continue
+        i = rng.randrange(buffer_size)
+        yield buffer[i]
+        buffer[i] = item
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+class ShardedBoardDataset(IterableDataset):
+    """Streams (image, [8,8] label) pairs out of a ShardWriter directory.
+
+    Each DataLoader worker reads its own subset of the shards sequentially;
+    shard order and the shuffle buffer are reseeded from set_epoch(). Images are
+    decoded in the worker to uint8 [3, size, size] (float in [0, 1] with
+    raw=False), like CachedChessBoardDataset.
+    """
+
+    def __init__(self, shard_dir, shuffle_buffer=1000, seed=0, size=INPUT_SIZE, raw=True):
+        self.shard_dir = shard_dir
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.size = size
+        self.raw = raw
+        index = read_index(shard_dir)
+        self.shards = [shard["name"] for shard in index["shards"]]
+        self.total = index["total"]
+        # Shared memory, so persistent workers see set_epoch() from the main process
+        self.epoch = torch.zeros((), dtype=torch.long).share_memory_()
+
+    def __len__(self):
+        return self.total
+
+    def set_epoch(self, epoch):
+        """Call before iterating each epoch; the shuffle depends only on seed and epoch."""
+        self.epoch.fill_(epoch)
+
+    def _worker_shards(self, rng):
+        shards = list(self.shards)
+        if self.shuffle_buffer:
+            rng.shuffle(shards)
+        info = get_worker_info()
+        if info is None:
+            return shards
+        return shards[info.id::info.num_workers]
+
+    def __iter__(self):
+        # Every worker draws the same shard order and takes its own slice of it.
+        info = get_worker_info()
+        worker = info.id if info else 0
+        epoch = int(self.epoch)
+        shards = self._worker_shards(random.Random(f"{self.seed}/{epoch}"))
+        buffer_rng = random.Random(f"{self.seed}/{epoch}/{worker}")
+        records = (record for shard in shards for record in iter_records(os.path.join(self.shard_dir, shard)))
+        if self.shuffle_buffer:
+            records = shuffled(records, self.shuffle_buffer, buffer_rng)
+        for _, image, fen in records:
+            array = preprocess_uint8(image, self.size)
+            tensor = torch.from_numpy(np.ascontiguousarray(array)) if self.raw else to_float_tensor(array)
+            yield tensor, torch.from_numpy(decode_placements([fen])[0]).long()
+
+
+def pack_folder(data_dir, out_dir, shard_size=DEFAULT_SHARD_SIZE):
+    """Copy a labelled image folder (labels.txt) into shards, keeping the
+    encoded image bytes as they are. labels.txt is validated before any
+    shard is written. Returns the record count."""
+    samples, _ = load_labels(data_dir)
+    with ShardWriter(out_dir, shard_size=shard_size) as writer:
+        for name, fen in samples:
+            key, ext = os.path.splitext(name)
+            with open(os.path.join(data_dir, name), "rb") as f:
+                writer.write(key, f.read(), fen.split()[0], ext.lstrip(".").lower())
+    return writer.count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pack a labelled image folder into tar shards.")
+    parser.add_argument("data_dir")
+    parser.add_argument("out_dir")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    args = parser.parse_args()
+    print(f"✅ Packed {pack_folder(args.data_dir, args.out_dir, args.shard_size)} boards into {args.out_dir}")
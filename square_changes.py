@@ -0,0 +1,114 @@
+import numpy as np
+import torch
+from ccn_model import board_to_squares
+from preprocessing import INPUT_SIZE, resize_rgb, to_float_tensor
+
+DEFAULT_GRID = 4  # signature cells per square side
+DEFAULT_NOISE_FLOOR = 4.0  # per-cell differences below this (0-255 scale) are ignored
+DEFAULT_THRESHOLD = 6.0  # mean cell difference above which a square counts as changed
+
+
+def square_signatures(images, grid=DEFAULT_GRID):
+    """Per-square signatures of board images: [..., 8, 8, grid * grid * 3] float32.
+
+    images is uint8 [H, W, 3] or [B, H, W, 3] with H and W divisible by
+    8 * grid; each square is reduced to a grid x grid map of mean colours,
+    so a piece change moves many cells while a stray pixel barely moves one.
+    """
+    images = np.asarray(images)
+    *lead, h, w, c = images.shape
+    bh, bw = h // (8 * grid), w // (8 * grid)
+    cells = images.reshape(*lead, 8, grid, bh, 8, grid, bw, c).mean(axis=(-5, -2), dtype=np.float32)
+    # [..., 8, grid, 8, grid, c] -> [..., 8, 8, grid, grid, c]
+    cells = np.moveaxis(cells, -3, -4)
+    return cells.reshape(*lead, 8, 8, grid * grid * c)
+
+
+def signature_distance(a, b, noise_floor=DEFAULT_NOISE_FLOOR):
+    """Mean per-cell difference between signatures, after dropping sub-noise cells: [..., 8, 8]."""
+    diff = np.abs(a - b)
+    diff[diff < noise_floor] = 0
+    return diff.mean(axis=-1)
+
+
+class SquareChangeDetector:
+    """Reports exactly which of the 64 squares changed since they were last accepted.
+
+    Only squares reported as changed have their reference updated, so slow
+    drift still adds up to a change while per-frame noise (cursor, clock,
+    compression) stays below the threshold.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, noise_floor=DEFAULT_NOISE_FLOOR,
+                 grid=DEFAULT_GRID, size=INPUT_SIZE):
+        self.threshold = threshold
+        self.noise_floor = noise_floor
+        self.grid = grid
+        self.size = size
+        self.reference = None
+
+    def signatures(self, image):
+        return square_signatures(resize_rgb(image, self.size), self.grid)
+
+    def changed(self, image):
+        """[8, 8] bool mask of squares that differ from the reference (all True at first)."""
+        if self.reference is None:
+            return np.ones((8, 8), dtype=bool)
+        distance = signature_distance(self.signatures(image), self.reference, self.noise_floor)
+        return distance > self.threshold
+
+    def update(self, image):
+        """changed() and then accept the changed squares into the reference."""
+        return self.accept(self.signatures(image))
+
+    def accept(self, signatures):
+        """update() for precomputed signatures."""
+        if self.reference is None:
+            self.reference = signatures
+            return np.ones((8, 8), dtype=bool)
+        mask = signature_distance(signatures, self.reference, self.noise_floor) > self.threshold
+        self.reference[mask] = signatures[mask]
+        return mask
+
+    def reset(self):
+        self.reference = None
+
+
+class IncrementalRecognizer:
+    """Keeps the last [8, 8, 13] logits for a board and only refreshes changed squares.
+
+    When no square changed the model is not run at all. Otherwise only the
+    changed squares take the new logits, so noise elsewhere cannot flip a
+    stable square; a square model classifies just those crops. Logits are
+    in image orientation, like the model output.
+    """
+
+    def __init__(self, model, detector=None):
+        self.model = model
+        self.detector = detector or SquareChangeDetector()
+        self.logits = None
+
+    def update(self, image):
+        """Returns (logits, [8, 8] changed mask) for a new capture of the board."""
+        mask = self.detector.update(image)
+        if self.logits is not None and not mask.any():
+            return self.logits, mask
+
+        tensor = to_float_tensor(resize_rgb(image, self.detector.size).transpose(2, 0, 1)).unsqueeze(0)
+        changed = torch.from_numpy(mask)
+        with torch.no_grad():
+            if self.logits is not None and hasattr(self.model, "classify_squares"):
+                # Square models (ccn_model.SquareCCN) only need the changed crops
+                crops = board_to_squares(tensor)[changed.flatten()]
+                self.logits[changed] = self.model.classify_squares(crops)
+                return self.logits, mask
+            logits = self.model(tensor)[0]
+        if self.logits is None:
+            self.logits = logits
+        else:
+            self.logits[changed] = logits[changed]
+        return self.logits, mask
+
+    def reset(self):
+        self.detector.reset()
+        self.logits = None
@@ -0,0 +1,56 @@
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import torch
+from ccn_model import board_to_squares
+from fen_predictor import preds_to_fen
+from preprocessing import preprocess_uint8, to_float_tensor
+
+DEFAULT_CACHE_SIZE = 8192
+
+
+class IncrementalSquareClassifier:
+    """Board recognition with a SquareCCN and a per-square logits cache keyed by crop hash.
+
+    Each of the 64 uint8 square crops is hashed; only crops not seen before
+    go through the model, in one batch. A board where two squares changed
+    costs two crop inferences. The cache is LRU-bounded to cache_size crops.
+    """
+
+    def __init__(self, model, cache_size=DEFAULT_CACHE_SIZE):
+        if not hasattr(model, "classify_squares"):
+            raise TypeError("IncrementalSquareClassifier needs a square model (ccn_model.SquareCCN)")
+        self.model = model
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def logits(self, source):
+        """[8, 8, 13] logits in image orientation for any image source (see preprocessing.py)."""
+        board = torch.from_numpy(np.ascontiguousarray(preprocess_uint8(source))).unsqueeze(0)
+        crops = board_to_squares(board).contiguous()
+        keys = [hashlib.blake2b(crop.numpy().tobytes(), digest_size=16).digest() for crop in crops]
+
+        missing = [i for i, key in enumerate(keys) if key not in self.cache]
+        if missing:
+            with torch.no_grad():
+                fresh = self.model.classify_squares(to_float_tensor(crops[missing]))
+            for i, row in zip(missing, fresh):
+                self.cache[keys[i]] = row
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+
+        rows = []
+        for key in keys:
+            self.cache.move_to_end(key)
+            rows.append(self.cache[key])
+        while len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return torch.stack(rows).reshape(8, 8, -1)
+
+    def predict_fen(self, source, my_color="w"):
+        preds = self.logits(source).argmax(dim=-1)
+        if my_color == "b":
+            preds = torch.flip(preds, dims=[0, 1])
+        return preds_to_fen(preds, my_color)
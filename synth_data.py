@@ -0,0 +1,135 @@
+import argparse
+import io
+import os
+import sys
+import time
+from multiprocessing import Pool
+import chess
+import chess.svg
+import numpy as np
+from PIL import Image
+from shards import DEFAULT_SHARD_SIZE, ShardWriter
+
+# (light, dark) square colours
+THEMES = {
+    "app": ("#eae9dc", "#8b7355"),
+    "lichess": ("#f0d9b5", "#b58863"),
+    "chesscom": ("#eeeed2", "#769656"),
+    "icysea": ("#d9e4e8", "#7a9db2"),
+    "blue": ("#dee3e6", "#8ca2ad"),
+    "grey": ("#e0e0e0", "#9e9e9e"),
+    "purple": ("#e8e0f0", "#8877b7"),
+}
+HIGHLIGHTS = ("#cdd26a", "#aaa23a", "#f7ec74", "#9bc700", "#f6f669")
+MAX_PLIES = 120
+OUTPUT_SIZES = (192, 512)  # side of the stored image, drawn uniformly
+RENDER_SIZE = 512
+
+
+def random_position(rng, max_plies=MAX_PLIES):
+    """A legal board reached by random moves from the start, and its last move."""
+    board = chess.Board()
+    last = None
+    for _ in range(int(rng.integers(0, max_plies + 1))):
+        moves = list(board.legal_moves)
+        if not moves:
+            break
+        last = moves[int(rng.integers(len(moves)))]
+        board.push(last)
+    return board, last
+
+
+def image_placement(board, flipped):
+    # Labels follow the image: a board drawn from black's side is stored rotated
+    if not flipped:
+        return board.board_fen()
+    return board.transform(lambda bb: chess.flip_horizontal(chess.flip_vertical(bb))).board_fen()
+
+
+def svg_to_image(svg, size):
+    try:
+        import cairosvg
+    except (ImportError, OSError) as e:
+        raise ImportError("Rendering boards requires cairosvg and the cairo library (pip install cairosvg)") from e
+    png = cairosvg.svg2png(bytestring=svg.encode(), output_width=size, output_height=size)
+    return Image.open(io.BytesIO(png)).convert("RGB")
+
+
+def render_sample(seed, index, themes=tuple(THEMES), jpeg_prob=0.5, coordinates_prob=0.2):
+    """Render one random position. Returns (key, encoded image, ext, placement).
+
+    Theme, side at the bottom, last-move highlight, check marker,
+    coordinates, output scale and JPEG quality are drawn from a generator
+    seeded by (seed, index), so any sample can be regenerated on its own.
+    """
+    rng = np.random.default_rng([seed, index])
+    board, last = random_position(rng)
+    light, dark = THEMES[themes[int(rng.integers(len(themes)))]]
+    flipped = bool(rng.random() < 0.5)
+    highlight = HIGHLIGHTS[int(rng.integers(len(HIGHLIGHTS)))]
+    svg = chess.svg.board(
+        board,
+        size=RENDER_SIZE,
+        orientation=chess.BLACK if flipped else chess.WHITE,
+        lastmove=last if rng.random() < 0.7 else None,
+        check=board.king(board.turn) if board.is_check() else None,
+        coordinates=bool(rng.random() < coordinates_prob),
+        colors={
+            "square light": light,
+            "square dark": dark,
+            "square light lastmove": highlight,
+            "square dark lastmove": highlight,
+        },
+    )
+    size = int(rng.integers(OUTPUT_SIZES[0], OUTPUT_SIZES[1] + 1))
+    image = svg_to_image(svg, size)
+
+    out = io.BytesIO()
+    if rng.random() < jpeg_prob:
+        image.save(out, format="JPEG", quality=int(rng.integers(35, 96)))
+        ext = "jpg"
+    else:
+        image.save(out, format="PNG", compress_level=1)
+        ext = "png"
+    return f"{seed:04d}-{index:08d}", out.getvalue(), ext, image_placement(board, flipped)
+
+
+def _render(job):
+    return render_sample(*job)
+
+
+def generate(out_dir, count, seed=0, workers=None, shard_size=DEFAULT_SHARD_SIZE, themes=tuple(THEMES),
+             jpeg_prob=0.5, coordinates_prob=0.2):
+    """Render count samples in a process pool straight into shards; returns the record count."""
+    jobs = ((seed, i, themes, jpeg_prob, coordinates_prob) for i in range(count))
+    start = time.perf_counter()
+    with Pool(workers) as pool, ShardWriter(out_dir, shard_size=shard_size) as writer:
+        # imap keeps records in index order, so the same seed gives the same shards
+        for done, (key, data, ext, placement) in enumerate(pool.imap(_render, jobs, chunksize=16), 1):
+            writer.write(key, data, placement, ext)
+            if done % 1000 == 0 or done == count:
+                print(f"\r{done}/{count} boards ({done / (time.perf_counter() - start):.1f} img/s)",
+                      end="", file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+    return writer.count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render random legal positions into a sharded training set.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=None, help="render processes (default: CPU count)")
+    parser.add_argument("--shard-size", type=int, default=DEFAULT_SHARD_SIZE)
+    parser.add_argument("--themes", nargs="+", choices=sorted(THEMES), default=sorted(THEMES))
+    parser.add_argument("--jpeg-prob", type=float, default=0.5, help="fraction stored as lossy JPEG")
+    parser.add_argument("--coordinates-prob", type=float, default=0.2, help="fraction drawn with a coordinate margin")
+    args = parser.parse_args()
+
+    count = generate(args.out_dir, args.count, args.seed, args.workers, args.shard_size, tuple(args.themes),
+                     args.jpeg_prob, args.coordinates_prob)
+    print(f"✅ Wrote {count} boards to {os.path.abspath(args.out_dir)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import argparse
+import glob
+import json
+import os
+import torch
+from PIL import ImageColor
+from fen_predictor import DEFAULT_BATCH_SIZE, load_image, predict_fens, predict_fens_details
+from model_registry import get_model
+from preprocessing import INPUT_SIZE
+
+THEMES_PATH = os.path.join("models", "themes.json")
+# Feature distance past which an image is not considered any prototype's theme;
+# chess.com frames sit within 0.09 of theirs, the app's wood theme 0.17 from all.
+DEFAULT_MAX_DISTANCE = 0.12
+
+# Ring of pixels inside each square's edge: pieces rarely reach it, grid
+# lines and highlights at the very edge are skipped.
+RING_INNER = 2
+RING_WIDTH = 4
+
+
+def _ring_mask(square_size):
+    idx = torch.arange(square_size)
+    edge = torch.minimum(idx, square_size - 1 - idx)
+    band = (edge >= RING_INNER) & (edge < RING_INNER + RING_WIDTH)
+    inside = edge >= RING_INNER
+    return (band[:, None] & inside[None, :]) | (inside[:, None] & band[None, :])
+
+
+def theme_features(images):
+    """Square colour statistics for a [B,3,H,W] batch (H, W divisible by 8).
+
+    Returns [B, 8]: median RGB of light squares, median RGB of dark squares,
+    and the mean in-square spread of each (textured boards score higher).
+    Square parity is the same for both board orientations.
+    """
+    b, c, h, w = images.shape
+    sq = h // 8
+    squares = images.reshape(b, c, 8, sq, 8, sq).permute(0, 2, 4, 1, 3, 5).reshape(b, 64, c, sq, sq)
+    ring = squares[..., _ring_mask(sq)]  # [B, 64, 3, P]
+    colour = ring.median(dim=-1).values  # [B, 64, 3]
+    spread = ring.std(dim=-1).mean(dim=-1)  # [B, 64]
+
+    light = torch.tensor([(r + f) % 2 == 0 for r in range(8) for f in range(8)])
+    return torch.cat([
+        colour[:, light].median(dim=1).values,
+        colour[:, ~light].median(dim=1).values,
+        spread[:, light].mean(dim=1, keepdim=True),
+        spread[:, ~light].mean(dim=1, keepdim=True),
+    ], dim=1)
+
+
+def flat_board(light, dark, size=INPUT_SIZE):
+    """[1,3,size,size] empty board in the given square colours ("#rrggbb"),
+    enough to fit a prototype for a theme with plain squares."""
+    colours = torch.tensor([ImageColor.getrgb(light), ImageColor.getrgb(dark)], dtype=torch.float32) / 255
+    parity = (torch.arange(8)[:, None] + torch.arange(8)[None, :]) % 2
+    board = colours[parity].permute(2, 0, 1)  # [3, 8, 8]
+    return board.repeat_interleave(size // 8, dim=1).repeat_interleave(size // 8, dim=2).unsqueeze(0)
+
+
+class ThemeRouter:
+    """Nearest-prototype classifier mapping a board image to the checkpoint for its theme.
+
+    With a fallback checkpoint, images farther than max_distance from every
+    prototype go to the fallback instead of the nearest theme.
+    """
+
+    def __init__(self, prototypes=None, fallback=None, max_distance=DEFAULT_MAX_DISTANCE):
+        # checkpoint path -> [K, 8] feature prototypes, one per theme the checkpoint was trained on
+        self.prototypes = {k: torch.as_tensor(v, dtype=torch.float32).reshape(-1, 8)
+                           for k, v in (prototypes or {}).items()}
+        self.fallback = fallback
+        self.max_distance = max_distance
+
+    def fit(self, examples):
+        """examples: {checkpoint path: [N,3,256,256] images of its theme, or a list
+        of such batches when the checkpoint covers several themes}."""
+        for checkpoint, images in examples.items():
+            sets = images if isinstance(images, (list, tuple)) else [images]
+            self.prototypes[checkpoint] = torch.stack([theme_features(s).mean(dim=0) for s in sets])
+        return self
+
+    def route(self, images):
+        """Return (checkpoint per image, distance to its nearest prototype)."""
+        if not self.prototypes:
+            raise ValueError("ThemeRouter has no prototypes; fit it or load a themes file first")
+        names = [n for n, centres in self.prototypes.items() for _ in range(len(centres))]
+        centres = torch.cat(list(self.prototypes.values()))
+        distances = torch.cdist(theme_features(images), centres)
+        best, idx = distances.min(dim=1)
+        checkpoints = [names[i] for i in idx.tolist()]
+        if self.fallback is not None:
+            checkpoints = [self.fallback if d > self.max_distance else c for c, d in zip(checkpoints, best.tolist())]
+        return checkpoints, best
+
+    def group(self, images):
+        """Indices of images per checkpoint, so every model sees one full batch."""
+        groups = {}
+        for i, checkpoint in enumerate(self.route(images)[0]):
+            groups.setdefault(checkpoint, []).append(i)
+        return groups
+
+    def save(self, path=THEMES_PATH):
+        # Checkpoints are stored relative to the themes file, so it works from any directory
+        base = os.path.dirname(os.path.abspath(path))
+        with open(path, "w") as f:
+            json.dump({os.path.relpath(k, base).replace(os.sep, "/"): v.tolist() for k, v in self.prototypes.items()},
+                      f, indent=2)
+
+    @classmethod
+    def load(cls, path=THEMES_PATH, fallback=None, max_distance=DEFAULT_MAX_DISTANCE):
+        with open(path) as f:
+            prototypes = json.load(f)
+        base = os.path.dirname(path)
+        return cls({os.path.normpath(os.path.join(base, k)): v for k, v in prototypes.items()}, fallback, max_distance)
+
+
+def _routed(router, images, colors, loader, predict):
+    if isinstance(colors, str):
+        colors = [colors] * len(images)
+    results = [None] * len(images)
+    for checkpoint, indices in router.group(images).items():
+        for i, result in zip(indices, predict(loader(checkpoint), images[indices], [colors[i] for i in indices])):
+            results[i] = result
+    return results
+
+
+def predict_routed(router, images, colors="w", batch_size=DEFAULT_BATCH_SIZE, loader=get_model):
+    """predict_fens with each image sent to the checkpoint for its theme.
+
+    images is a [N,3,256,256] tensor; FENs come back in input order.
+    """
+    return _routed(router, images, colors, loader, lambda m, x, c: predict_fens(m, x, c, batch_size))
+
+
+def predict_routed_details(router, images, colors="w", batch_size=DEFAULT_BATCH_SIZE, top_k=3, legal=False,
+                           loader=get_model):
+    """predict_fens_details with per-theme checkpoints, in input order."""
+    return _routed(router, images, colors, loader,
+                   lambda m, x, c: predict_fens_details(m, x, c, batch_size, top_k, legal))
+
+
+def _load_dir(image_dir):
+    paths = sorted(glob.glob(os.path.join(image_dir, "*.png")))
+    if not paths:
+        raise FileNotFoundError(f"No .png images found in {image_dir}")
+    return torch.cat([load_image(p) for p in paths])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fit theme prototypes: example images or square colours per checkpoint.")
+    parser.add_argument("--theme", nargs=2, action="append", default=[], metavar=("CHECKPOINT", "IMAGE_DIR"))
+    parser.add_argument("--colors", nargs=3, action="append", default=[], metavar=("CHECKPOINT", "LIGHT", "DARK"),
+                        help="plain-square theme given as #rrggbb colours")
+    parser.add_argument("--out", default=THEMES_PATH)
+    args = parser.parse_args()
+    if not args.theme and not args.colors:
+        parser.error("give at least one --theme or --colors")
+
+    # Repeating a checkpoint adds one prototype per theme it covers
+    examples = {}
+    for checkpoint, image_dir in args.theme:
+        examples.setdefault(checkpoint, []).append(_load_dir(image_dir))
+    for checkpoint, light, dark in args.colors:
+        examples.setdefault(checkpoint, []).append(flat_board(light, dark))
+    router = ThemeRouter.load(args.out) if os.path.exists(args.out) else ThemeRouter()
+    router.fit(examples)
+    router.save(args.out)
+    count = sum(len(centres) for centres in router.prototypes.values())
+    print(f"✅ Saved {count} theme prototypes for {len(router.prototypes)} checkpoints to {args.out}")
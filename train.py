@@ -0,0 +1,201 @@
+import argparse
+import contextlib
+import os
+import time
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, IterableDataset
+from augment import BatchAugmenter
+from ccn_model import CCN, SquareCCN
+from dataset import CACHE_INDEX, CachedChessBoardDataset, ChessBoardDataset, board_accuracy
+from shards import SHARD_INDEX, ShardedBoardDataset
+
+ARCHITECTURES = {"ccn": CCN, "square": SquareCCN}
+RESUME_SUFFIX = ".resume.pth"
+DEFAULT_BATCH_SIZE = 32
+DEFAULT_PREFETCH = 4
+
+
+def open_dataset(path, shuffle_buffer=1000, seed=0):
+    """A shard directory (shards.json), a compile_dataset cache (index.json)
+    or a labelled image folder (labels.txt).
+
+    Shard and cache images come back as uint8 and are scaled to [0, 1] by
+    the training loop, so workers only move a quarter of the bytes.
+    """
+    if os.path.exists(os.path.join(path, SHARD_INDEX)):
+        return ShardedBoardDataset(path, shuffle_buffer, seed)
+    if os.path.exists(os.path.join(path, CACHE_INDEX)):
+        return CachedChessBoardDataset(path, raw=True)
+    return ChessBoardDataset(path)
+
+
+def make_loader(dataset, batch_size=DEFAULT_BATCH_SIZE, workers=0, prefetch=DEFAULT_PREFETCH,
+                persistent=True, shuffle=True, seed=0):
+    options = {}
+    if workers > 0:
+        # Persistent workers keep their memory maps and file handles between epochs
+        options = {"prefetch_factor": prefetch, "persistent_workers": persistent}
+    if isinstance(dataset, IterableDataset):
+        shuffle = False  # streamed datasets shuffle themselves
+    return DataLoader(
+        dataset, batch_size=batch_size, shuffle=shuffle, num_workers=workers, drop_last=False,
+        generator=torch.Generator().manual_seed(seed) if shuffle else None, **options,
+    )
+
+
+def to_input(images, channels_last=False):
+    if images.dtype == torch.uint8:
+        images = images.float().div_(255.0)
+    if channels_last:
+        images = images.contiguous(memory_format=torch.channels_last)
+    return images
+
+
+def autocast(bf16):
+    # bfloat16 keeps float32's exponent range, so no loss scaling is needed
+    return torch.autocast("cpu", dtype=torch.bfloat16) if bf16 else contextlib.nullcontext()
+
+
+def _step(optimizer, batches):
+    # Gradients were summed over `batches` batches: average them, so a short
+    # final window weighs as much as a full one
+    if batches > 1:
+        for group in optimizer.param_groups:
+            for param in group["params"]:
+                if param.grad is not None:
+                    param.grad.div_(batches)
+    optimizer.step()
+    optimizer.zero_grad(set_to_none=True)
+
+
+def train_epoch(model, loader, optimizer, criterion, accumulation=1, bf16=False, channels_last=False,
+                augment=None):
+    """One pass over loader. Returns (mean loss, samples, seconds).
+
+    Gradients of `accumulation` consecutive batches are summed before each
+    optimizer step, so the effective batch is accumulation * batch_size.
+    augment (a BatchAugmenter) is applied to each whole batch.
+    """
+    model.train()
+    total_loss, samples = 0.0, 0
+    start = time.perf_counter()
+    optimizer.zero_grad(set_to_none=True)
+    for step, (images, labels) in enumerate(loader, 1):
+        if augment is not None:
+            images, labels = augment(images, labels)
+        images = to_input(images, channels_last)
+        with autocast(bf16):
+            logits = model(images)
+        loss = criterion(logits.float().reshape(-1, logits.shape[-1]), labels.reshape(-1))
+        loss.backward()
+        if step % accumulation == 0:
+            _step(optimizer, accumulation)
+        total_loss += loss.item() * len(labels)
+        samples += len(labels)
+    if samples and step % accumulation:
+        _step(optimizer, step % accumulation)  # the last, partial accumulation window
+    return total_loss / max(samples, 1), samples, time.perf_counter() - start
+
+
+def evaluate(model, loader, bf16=False, channels_last=False):
+    """(per-square accuracy, whole-board accuracy) over loader."""
+    model.eval()
+    preds, targets = [], []
+    with torch.no_grad(), autocast(bf16):
+        for images, labels in loader:
+            preds.append(model(to_input(images, channels_last)).argmax(-1))
+            targets.append(labels)
+    return board_accuracy(torch.cat(preds), torch.cat(targets))
+
+
+def resume_path(out):
+    return os.path.splitext(out)[0] + RESUME_SUFFIX
+
+
+def save_resume(path, model, optimizer, epoch, arch):
+    # Written to a temporary file first so an interrupted save never leaves a broken checkpoint
+    torch.save({"arch": arch, "epoch": epoch, "model": model.state_dict(), "optimizer": optimizer.state_dict()},
+               path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def load_resume(path, model, optimizer, arch):
+    """Restores model and optimizer state; returns the number of epochs already done."""
+    state = torch.load(path, map_location="cpu")
+    if state["arch"] != arch:
+        raise ValueError(f"{path} was trained with --arch {state['arch']}, not {arch}")
+    model.load_state_dict(state["model"])
+    optimizer.load_state_dict(state["optimizer"])
+    return state["epoch"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a board recognition model.")
+    parser.add_argument("data", help="shard directory, compile_dataset cache or labelled image folder")
+    parser.add_argument("--val", default=None, help="validation shards, cache or folder")
+    parser.add_argument("--arch", choices=sorted(ARCHITECTURES), default="ccn")
+    parser.add_argument("-o", "--out", default="ccn_model_final.pth", help="trained weights (loadable by load_model)")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--accumulation", type=int, default=1, help="batches per optimizer step")
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--weight-decay", type=float, default=1e-4)
+    parser.add_argument("--workers", type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH, help="batches prefetched per worker")
+    parser.add_argument("--no-persistent-workers", action="store_true")
+    parser.add_argument("--threads", type=int, default=None, help="intra-op threads (default: torch's choice)")
+    parser.add_argument("--channels-last", action="store_true")
+    parser.add_argument("--bf16", action="store_true", help="bfloat16 autocast on CPU")
+    parser.add_argument("--augment", action="store_true", help="batched colour/blur/JPEG/shift/highlight augmentation")
+    parser.add_argument("--flip-prob", type=float, default=0.0,
+                        help="with --augment, chance of showing a board from the other side (tightly cropped data only)")
+    parser.add_argument("--resume", action="store_true", help=f"continue from <out>{RESUME_SUFFIX}")
+    parser.add_argument("--shuffle-buffer", type=int, default=1000, help="records held for shuffling shard streams")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    train_set = open_dataset(args.data, args.shuffle_buffer, args.seed)
+    loader = make_loader(train_set, args.batch_size, args.workers, args.prefetch,
+                         not args.no_persistent_workers, seed=args.seed)
+    val_loader = None
+    if args.val:
+        val_loader = make_loader(open_dataset(args.val, shuffle_buffer=0), args.batch_size, args.workers, args.prefetch,
+                                 not args.no_persistent_workers, shuffle=False)
+
+    model = ARCHITECTURES[args.arch]()
+    if args.channels_last:
+        model = model.to(memory_format=torch.channels_last)
+    optimizer = torch.optim.AdamW(model.parameters(), lr=args.lr, weight_decay=args.weight_decay)
+    criterion = nn.CrossEntropyLoss()
+    augment = BatchAugmenter(flip=args.flip_prob, seed=args.seed) if args.augment else None
+
+    checkpoint = resume_path(args.out)
+    start_epoch = 0
+    if args.resume and os.path.exists(checkpoint):
+        start_epoch = load_resume(checkpoint, model, optimizer, args.arch)
+        print(f"🔁 Resumed from {checkpoint} after epoch {start_epoch}")
+
+    for epoch in range(start_epoch, args.epochs):
+        if isinstance(train_set, ShardedBoardDataset):
+            train_set.set_epoch(epoch)
+        loss, samples, seconds = train_epoch(model, loader, optimizer, criterion,
+                                             args.accumulation, args.bf16, args.channels_last, augment)
+        message = f"Epoch {epoch + 1}/{args.epochs}: loss {loss:.4f}, {samples / seconds:.1f} samples/s"
+        if val_loader is not None:
+            square, exact = evaluate(model, val_loader, args.bf16, args.channels_last)
+            message += f", val per-square {square:.2%}, whole-board {exact:.2%}"
+        print(message)
+        save_resume(checkpoint, model, optimizer, epoch + 1, args.arch)
+        # Plain contiguous state_dict, so load_model / build_model pick the architecture up
+        torch.save({k: v.contiguous() for k, v in model.state_dict().items()}, args.out)
+
+    print(f"✅ Saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
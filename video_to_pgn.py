@@ -0,0 +1,225 @@
+import argparse
+import datetime
+import os
+import sys
+import chess
+import chess.pgn
+import numpy as np
+from board_locator import BoardLocator
+from fen_codec import PIECE_TO_IDX, encode_placements
+from fen_predictor import load_model, predict_fen_details
+from inference import BACKENDS
+from preprocessing import preprocess
+from square_changes import DEFAULT_THRESHOLD, SquareChangeDetector, signature_distance
+
+DEFAULT_STRIDE = 2
+DEFAULT_SETTLE_FRAMES = 2
+DEFAULT_MAX_MISMATCH = 3  # squares a matched move may disagree with the argmax board
+
+
+def iter_frames(path, stride=DEFAULT_STRIDE):
+    """Yields (frame index, timestamp in seconds, RGB uint8 frame) for every stride-th frame.
+
+    Skipped frames are only grabbed, not decoded, so sampling is cheap.
+    """
+    try:
+        import cv2
+    except ImportError as e:
+        raise ImportError("Reading video requires OpenCV (pip install opencv-python-headless)") from e
+
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise OSError(f"Could not open video: {path}")
+    fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+    index = 0
+    try:
+        while capture.grab():
+            if index % stride == 0:
+                ok, frame = capture.retrieve()
+                if not ok:
+                    break
+                yield index, index / fps, cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            index += 1
+    finally:
+        capture.release()
+
+
+def crop(frame, region):
+    if region is None:
+        return frame
+    x, y, w, h = region
+    return frame[y:y + h, x:x + w]
+
+
+def tracked_boards(frames, locator):
+    """Yields (index, seconds, board crop) with the board found in every frame by a
+    BoardLocator (which re-checks its cached box cheaply); frames without a
+    confident board, such as title cards, are dropped."""
+    for index, seconds, frame in frames:
+        board, location = locator.crop(frame)
+        if board is not None and location.confidence >= locator.reuse_confidence:
+            yield index, seconds, board
+
+
+def settled_frames(frames, region=None, threshold=DEFAULT_THRESHOLD, settle=DEFAULT_SETTLE_FRAMES, locator=None):
+    """Yields (index, seconds, board crop) once per change of the board's squares,
+    after it has stayed still for `settle` sampled frames (so piece animations finish).
+
+    The board is cropped at region or, when that is None and a BoardLocator
+    is given, wherever the locator finds it in each frame.
+    """
+    squares = SquareChangeDetector(threshold)  # compares against the last board we emitted
+    previous = None
+    still = 0
+    if region is None and locator is not None:
+        boards = tracked_boards(frames, locator)
+    else:
+        boards = ((index, seconds, crop(frame, region)) for index, seconds, frame in frames)
+    for index, seconds, board in boards:
+        signatures = squares.signatures(board)
+        moving = previous is not None and (
+            signature_distance(signatures, previous, squares.noise_floor) > threshold
+        ).any()
+        previous = signatures
+        still = 0 if moving else still + 1
+        if still >= settle and squares.accept(signatures).any():
+            yield index, seconds, board
+
+
+def board_classes(board):
+    """[64] class indices of a python-chess board, row 0 = rank 8 like the model output."""
+    classes = np.zeros(64, dtype=np.int64)
+    for square, piece in board.piece_map().items():
+        row = 7 - chess.square_rank(square)
+        classes[row * 8 + chess.square_file(square)] = PIECE_TO_IDX[piece.symbol()]
+    return classes
+
+
+class GameTracker:
+    """Turns a sequence of per-square probability grids into legal moves.
+
+    Each observation is explained by the current position, one legal move, or
+    two (a move missed between samples), whichever the model finds most
+    probable; observations nothing explains within max_mismatch squares are
+    counted and ignored. The first observation sets up the position; the side
+    to move is taken from whichever side's move explains the next change.
+    """
+
+    def __init__(self, max_mismatch=DEFAULT_MAX_MISMATCH):
+        self.max_mismatch = max_mismatch
+        self.board = None
+        self.game = None
+        self.node = None
+        self.unmatched = 0
+
+    def _start(self, placement):
+        board = chess.Board(None)
+        board.set_board_fen(placement)
+        # Allow castling wherever king and rook still stand on their home squares
+        board.castling_rights = chess.BB_CORNERS
+        board.castling_rights = board.clean_castling_rights()
+        self.board = board
+        self.game = chess.pgn.Game()
+        self.node = self.game
+
+    def _explain(self, lp, observed):
+        # Score the current position, every legal move and every two-move sequence at once
+        sequences, boards = [[]], [board_classes(self.board)]
+        for move in self.board.legal_moves:
+            self.board.push(move)
+            sequences.append([move])
+            boards.append(board_classes(self.board))
+            for reply in self.board.legal_moves:
+                self.board.push(reply)
+                sequences.append([move, reply])
+                boards.append(board_classes(self.board))
+                self.board.pop()
+            self.board.pop()
+
+        boards = np.stack(boards)
+        scores = lp[np.arange(64), boards].sum(axis=1)
+        # Prefer shorter explanations when they are equally probable
+        scores -= 1e-3 * np.array([len(m) for m in sequences])
+        best = int(scores.argmax())
+        mismatch = int((boards[best] != observed).sum())
+        return sequences[best], mismatch, scores[best]
+
+    def observe(self, log_probs, comment=None):
+        """log_probs: [8, 8, 13] in white's orientation. Returns the moves pushed (maybe none)."""
+        lp = log_probs.reshape(64, -1).numpy()
+        observed = lp.argmax(axis=1)
+        if self.board is None:
+            self._start(encode_placements(observed.reshape(8, 8))[0])
+            return []
+
+        moves, mismatch, score = self._explain(lp, observed)
+        if self.node is self.game:
+            # Nothing played yet: the recording may start with either side to move
+            self.board.turn = not self.board.turn
+            other = self._explain(lp, observed)
+            if other[2] > score:
+                moves, mismatch, score = other
+            else:
+                self.board.turn = not self.board.turn
+        if mismatch > self.max_mismatch:
+            self.unmatched += 1
+            return []
+
+        if moves and self.node is self.game and self.board.fen() != chess.STARTING_FEN:
+            self.game.setup(self.board)
+        for move in moves:
+            self.node = self.node.add_variation(move)
+            self.board.push(move)
+        if moves and comment:
+            self.node.comment = comment
+        return moves
+
+
+def digitize(frames, model, region=None, color="w", threshold=DEFAULT_THRESHOLD,
+             settle=DEFAULT_SETTLE_FRAMES, tracker=None, locator=None):
+    """Run the model on each settled board change and feed the tracker; returns the tracker."""
+    tracker = tracker or GameTracker()
+    for index, seconds, board in settled_frames(frames, region, threshold, settle, locator):
+        prediction = predict_fen_details(model, preprocess(board).unsqueeze(0), color, top_k=1)
+        stamp = str(datetime.timedelta(seconds=round(seconds, 2)))
+        tracker.observe(prediction.square_probs.clamp_min(1e-12).log(), comment=f"frame {index} @ {stamp}")
+    return tracker
+
+
+def parse_region(text):
+    x, y, w, h = (int(v) for v in text.split(","))
+    return x, y, w, h
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Digitize a recorded game video into a PGN.")
+    parser.add_argument("video")
+    parser.add_argument("-o", "--out", default=None, help="output PGN (default: <video>.pgn)")
+    parser.add_argument("--model", default="ccn_model.pth")
+    parser.add_argument("--backend", default="auto", choices=BACKENDS)
+    parser.add_argument("--region", type=parse_region, default=None, help="board rectangle x,y,w,h in the frame (default: located and tracked in every frame)")
+    parser.add_argument("--color", default="w", choices=("w", "b"), help="side at the bottom of the board")
+    parser.add_argument("--stride", type=int, default=DEFAULT_STRIDE, help="decode every Nth frame")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--settle", type=int, default=DEFAULT_SETTLE_FRAMES)
+    args = parser.parse_args()
+
+    model = load_model(args.model, backend=args.backend)
+    frames = iter_frames(args.video, args.stride)
+    locator = BoardLocator() if args.region is None else None
+    tracker = digitize(frames, model, args.region, args.color, args.threshold, args.settle, locator=locator)
+    if locator is not None:
+        print(f"📐 Board located {locator.detected} times, cached box reused on {locator.reused} frames")
+    if tracker.game is None:
+        sys.exit("❌ No board found in the video")
+
+    tracker.game.headers["Event"] = os.path.basename(args.video)
+    tracker.game.headers["Date"] = "????.??.??"
+    out = args.out or os.path.splitext(args.video)[0] + ".pgn"
+    with open(out, "w") as f:
+        print(tracker.game, file=f, end="\n\n")
+    print(f"✅ Wrote {len(list(tracker.game.mainline_moves()))} plies to {out} ({tracker.unmatched} unexplained board changes)")
+
+
+if __name__ == "__main__":
+    main()